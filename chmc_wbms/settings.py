@@ -142,3 +142,60 @@ ADMIN_SESSION_COOKIE_NAME = 'admin_sessionid'
 EMPLOYEE_SESSION_COOKIE_NAME = 'employee_sessionid'
 
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Fixed number of digits in formatted patient IDs (e.g. 4 for PID-0001). When unset, the
+# width grows with the patient count; it is stored in the database and each worker re-reads
+# it at most every PATIENT_ID_WIDTH_REFRESH_INTERVAL seconds.
+PATIENT_ID_WIDTH = None
+PATIENT_ID_WIDTH_REFRESH_INTERVAL = 5
+
+# Public authenticity checker: how often (seconds) the in-memory filter of issued codes
+# picks up codes issued by other workers and is rebuilt, and how many recent hits are kept in memory.
+VERIFICATION_FILTER_REFRESH_INTERVAL = 5
+VERIFICATION_FILTER_REBUILD_INTERVAL = 600
+VERIFICATION_HIT_CACHE_SIZE = 1024
+VERIFICATION_HIT_CACHE_TTL = 60
+
+# Patient typeahead suggestions are answered from an in-memory prefix index (see webapp/typeahead.py).
+PATIENT_TYPEAHEAD_REFRESH_INTERVAL = 5
+PATIENT_TYPEAHEAD_REBUILD_INTERVAL = 600
+
+# New patients scoring at least this against an existing one (0-1) are flagged as possible duplicates.
+PATIENT_DUPLICATE_THRESHOLD = 0.75
+
+# Background jobs (document generation) are run by `python manage.py run_job_worker`.
+# Set BACKGROUND_JOBS_EAGER = True to run them in the web process after commit instead.
+BACKGROUND_JOBS_EAGER = False
+BACKGROUND_JOB_LOCK_TIMEOUT = 600
+BACKGROUND_JOB_RETRY_DELAY = 30
+
+# Backend converting edited .docx documents to PDF for view_document and verify_document.
+# LibreOfficeConverter keeps a pool of headless LibreOffice listeners in each worker process, on ports
+# the operating system picks (requires `pip install unoserver`); WordConverter keeps one MS Word
+# instance per worker process open through COM on Windows hosts.
+DOCUMENT_CONVERTER = 'webapp.converters.WordConverter' if os.name == 'nt' else 'webapp.converters.LibreOfficeConverter'
+DOCUMENT_CONVERTER_OPTIONS = {
+    'pool_size': 2,
+    'timeout': 60,
+}
+
+# Converted PDFs are cached by the SHA-256 of their source .docx and evicted least recently used first.
+PDF_CACHE_DIR = os.path.join(BASE_DIR, 'pdf_cache')
+PDF_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# How examination documents are filled in: 'xml' substitutes placeholders directly in the
+# template's XML, 'python-docx' edits the parsed document. Both produce the same document.
+DOCUMENT_TEMPLATE_ENGINE = 'xml'
+
+# Resolution of the 1-inch patient photo and signature copies embedded in examination documents.
+DOCUMENT_IMAGE_DPI = 300
+
+# Uploaded and generated media are stored once per distinct content (see webapp/storage.py).
+STORAGES = {
+    'default': {
+        'BACKEND': 'webapp.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
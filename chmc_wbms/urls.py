@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from webapp.views import edit_examination, upload_examination_result_image, search_patient, verify_document, employee_examination_view,download_document, upload_edited_document, view_document, employee_login_view, admin_login_view, admin_dashboard_view, admin_logout_view, create_account_view, employee_dashboard_view, patients_list_view, manage_account_view, edit_account_view, delete_account_view, employee_logout_view, edit_profile_view, employee_patients_list_view, assoc_doc_readings_view, associated_doctors_view, document_results_view, add_examination
+from webapp.views import edit_examination, upload_examination_result_image, search_patient, patient_typeahead_view, verify_document, verify_documents_batch, employee_examination_view, export_examinations,download_document, upload_edited_document, view_document, employee_login_view, admin_login_view, admin_dashboard_view, admin_logout_view, create_account_view, employee_dashboard_view, patients_list_view, manage_account_view, edit_account_view, delete_account_view, employee_logout_view, edit_profile_view, employee_patients_list_view, patient_history, assoc_doc_readings_view, associated_doctors_view, document_results_view, add_examination
 from django.conf.urls.static import static
 from django.conf import settings
     
@@ -35,15 +35,20 @@ urlpatterns = [
     path('delete_account/<int:account_id>/', delete_account_view, name='delete_account'),
     path('edit_profile/<int:account_id>/', edit_profile_view, name='edit_profile'),
     path('employee_patients_list/', employee_patients_list_view, name='employee_patients_list'),
+    path('patients/<int:pk>/history/', patient_history, name='patient_history'),
     path('assoc_doc_readings', assoc_doc_readings_view, name='assoc_doc_readings'),
     path('associated_doctors/', associated_doctors_view, name='associated_doctors'),
     path('document_results/', document_results_view, name='document_results'),
     path('employee_examination/', employee_examination_view, name='employee_examination'),
+    path('examinations/export/', export_examinations, name='export_examinations'),
     path('add_examination/', add_examination, name='add_examination'),
     path('examination/<int:pk>/upload/', upload_edited_document, name='upload_edited_document'),
     path('examination/<int:pk>/view/', view_document, name='view_document'),
+    path('examination/<int:pk>/download/', download_document, name='download_document'),
     path('verify-document/', verify_document, name='verify_document'),
+    path('verify-document/batch/', verify_documents_batch, name='verify_documents_batch'),
     path('search_patient/', search_patient, name='search_patient'),
+    path('patients/typeahead/', patient_typeahead_view, name='patient_typeahead'),
     path('upload-result-image/<int:pk>/', upload_examination_result_image, name='upload_examination_result_image'),
     path('edit-examination/<int:pk>/', edit_examination, name='edit_examination'),
     
@@ -1,11 +1,12 @@
 from django.contrib import admin
-from .models import CustomUser, Appointment, ServiceType, AppointmentServiceType, Examination, Patient, Payment
+from .models import CustomUser, Appointment, ServiceType, AppointmentServiceType, Examination, Patient, Payment, FileNumberSequence, BackgroundJob
 
 
 class ExaminationAdmin(admin.ModelAdmin):
-    list_display = ('id', 'patient', 'attending_doctor', 'date_created', 'get_unique_code', 'get_raw_unique_code')
+    list_display = ('id', 'file_number', 'patient', 'attending_doctor', 'date_created', 'get_unique_code', 'get_raw_unique_code')
+    list_select_related = ('patient', 'attending_doctor')
     readonly_fields = ('get_unique_code', 'get_raw_unique_code')
-    search_fields = ('get_unique_code', 'get_raw_unique_code')
+    search_fields = ('unique_code', 'raw_unique_code')
 
     def get_unique_code(self, obj):
         return obj.get_unique_code()
@@ -45,10 +46,18 @@ class PatientAdmin(admin.ModelAdmin):
     get_secure_hashed_id.short_description = "Raw SHA-256 Code"
 
 
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'examination', 'status', 'attempts', 'run_after', 'locked_by', 'updated_at')
+    list_filter = ('task', 'status')
+    list_select_related = ('examination__patient',)
+
+
 admin.site.register(CustomUser)
 admin.site.register(Appointment)
 admin.site.register(ServiceType)
 admin.site.register(AppointmentServiceType)
 admin.site.register(Examination, ExaminationAdmin)
 admin.site.register(Patient, PatientAdmin)
-admin.site.register(Payment)
\ No newline at end of file
+admin.site.register(Payment)
+admin.site.register(FileNumberSequence)
+admin.site.register(BackgroundJob, BackgroundJobAdmin)
\ No newline at end of file
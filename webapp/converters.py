@@ -0,0 +1,290 @@
+import atexit
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ConversionError(RuntimeError):
+    pass
+
+
+class BaseConverter:
+    """Converts .docx files to PDF. Subclasses implement ``_convert`` and ``health_check``."""
+
+    def __init__(self, pool_size=1, timeout=60):
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+    def convert(self, docx_path, pdf_path=None):
+        """Convert ``docx_path`` and return the path of the PDF (next to the .docx by default)."""
+        if pdf_path is None:
+            pdf_path = os.path.splitext(docx_path)[0] + '.pdf'
+        try:
+            self._convert(docx_path, pdf_path)
+        except ConversionError:
+            raise
+        except Exception as e:
+            raise ConversionError(f"Error during conversion: {e}")
+        return pdf_path
+
+    def _convert(self, docx_path, pdf_path):
+        raise NotImplementedError
+
+    def health_check(self):
+        """Return a dict with an overall ``ok`` flag and backend specific details."""
+        raise NotImplementedError
+
+
+class WordConverter(BaseConverter):
+    """
+    MS Word through COM automation. Windows only. Each process keeps one
+    Word instance open on a dedicated thread (COM objects belong to the
+    thread that created them), which runs the conversions one at a time.
+    """
+
+    def __init__(self, pool_size=1, timeout=60):
+        super().__init__(pool_size=1, timeout=timeout)
+        self._requests = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def _call(self, function):
+        """Run ``function(word)`` on the Word thread and return its result."""
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='word-converter', daemon=True)
+                self._thread.start()
+        request = Future()
+        self._requests.put((function, request))
+        try:
+            return request.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            request.cancel()  # Skipped if Word has not started on it yet
+            raise ConversionError(f"Conversion timed out after {self.timeout} seconds.")
+
+    def _run(self):
+        import pythoncom
+        from win32com.client import DispatchEx
+
+        # Initialize COM library
+        pythoncom.CoInitialize()
+        word = None
+        try:
+            while (item := self._requests.get()) is not None:
+                function, request = item
+                if not request.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if word is None:
+                        # A private instance, never the Word window someone has open
+                        word = DispatchEx('Word.Application')
+                        word.Visible = False  # Keep Word invisible
+                        word.DisplayAlerts = False
+                    request.set_result(function(word))
+                except Exception as e:
+                    # Word may have crashed or been closed; the next request starts a new instance
+                    word = self._quit(word)
+                    request.set_exception(e)
+        finally:
+            self._quit(word)
+            # Ensure COM library is uninitialized
+            pythoncom.CoUninitialize()
+
+    @staticmethod
+    def _quit(word):
+        if word is not None:
+            try:
+                word.Quit()
+            except Exception:
+                pass
+        return None
+
+    def _convert(self, docx_path, pdf_path):
+        def save_as_pdf(word):
+            doc = word.Documents.Open(docx_path, ReadOnly=True)
+            try:
+                doc.SaveAs(pdf_path, FileFormat=17)  # 17 corresponds to the PDF format
+            finally:
+                doc.Close(False)
+
+        self._call(save_as_pdf)
+
+    def health_check(self):
+        try:
+            return {'ok': True, 'version': self._call(lambda word: str(word.Version))}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def shutdown(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join(timeout=10)
+
+
+def _free_port():
+    """A TCP port nothing listens on right now, chosen by the operating system."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _UnoServer:
+    """One long-lived headless LibreOffice instance, listening through unoserver."""
+
+    def __init__(self, executable):
+        self.executable = executable
+        self.port = None
+        self.uno_port = None
+        self.process = None
+        self.profile_dir = None
+
+    def is_alive(self):
+        # Only a listener this process started counts, so a hung one can always be stopped and replaced
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def start(self, startup_timeout):
+        self.stop()
+        # Ports of our own rather than fixed ones, which every worker process would share
+        self.port, self.uno_port = _free_port(), _free_port()
+        # Each instance needs its own profile, LibreOffice locks it while running
+        self.profile_dir = tempfile.mkdtemp(prefix=f'chmc-lo-{self.port}-')
+        command = [
+            getattr(settings, 'UNOSERVER_BINARY', 'unoserver'),
+            '--interface', '127.0.0.1',
+            '--port', str(self.port),
+            '--uno-port', str(self.uno_port),
+            '--user-installation', f'file://{self.profile_dir}',
+        ]
+        if self.executable:
+            command += ['--executable', self.executable]
+        try:
+            self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            self.stop()
+            raise ConversionError(f"Could not start LibreOffice listener: {e}")
+
+        deadline = time.monotonic() + startup_timeout
+        while time.monotonic() < deadline:
+            if self.is_alive():
+                return
+            if self.process.poll() is not None:
+                break  # Exited, e.g. because another program took the port first
+            time.sleep(0.25)
+        port = self.port
+        self.stop()
+        raise ConversionError(f"LibreOffice listener on port {port} failed to start.")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        self.port = self.uno_port = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+class LibreOfficeConverter(BaseConverter):
+    """
+    A pool of long-lived headless LibreOffice listeners (started with
+    unoserver), owned by this process on ports of their own. At most
+    ``pool_size`` conversions run at once per process; a listener that dies
+    or exceeds the timeout is restarted before its next use.
+    """
+
+    def __init__(self, pool_size=2, timeout=60, executable=None, startup_timeout=30):
+        super().__init__(pool_size=pool_size, timeout=timeout)
+        self.startup_timeout = startup_timeout
+        self.servers = [_UnoServer(executable) for _index in range(pool_size)]
+        self._idle = queue.Queue()
+        for server in self.servers:
+            self._idle.put(server)
+        atexit.register(self.shutdown)
+
+    def _convert(self, docx_path, pdf_path):
+        try:
+            server = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise ConversionError("All document converters are busy, please try again.")
+        try:
+            if not server.is_alive():
+                server.start(self.startup_timeout)
+            try:
+                subprocess.run(
+                    [
+                        getattr(settings, 'UNOCONVERT_BINARY', 'unoconvert'),
+                        '--host', '127.0.0.1',
+                        '--port', str(server.port),
+                        '--convert-to', 'pdf',
+                        docx_path, pdf_path,
+                    ],
+                    check=True, capture_output=True, timeout=self.timeout,
+                )
+            except subprocess.TimeoutExpired:
+                server.stop()  # A hung listener is replaced on its next use
+                raise ConversionError(f"Conversion timed out after {self.timeout} seconds.")
+            except subprocess.CalledProcessError as e:
+                raise ConversionError(f"Error during conversion: {e.stderr.decode(errors='replace').strip()}")
+        finally:
+            self._idle.put(server)
+
+    def health_check(self):
+        """Connect to this process's listeners, starting an idle one if none is running."""
+        status = {'pool_size': self.pool_size, 'idle': self._idle.qsize()}
+        if not any(server.is_alive() for server in self.servers):
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                pass  # Every listener is busy starting up or converting
+            else:
+                try:
+                    server.start(self.startup_timeout)
+                except ConversionError as e:
+                    status['error'] = str(e)
+                finally:
+                    self._idle.put(server)
+        status['running'] = [server.port for server in self.servers if server.is_alive()]
+        status['ok'] = bool(status['running'])
+        return status
+
+    def shutdown(self):
+        for server in self.servers:
+            server.stop()
+
+
+_converter = None
+_converter_lock = threading.Lock()
+
+
+def get_converter():
+    """Return the process-wide converter configured by settings.DOCUMENT_CONVERTER."""
+    global _converter
+    with _converter_lock:
+        if _converter is None:
+            converter_class = import_string(settings.DOCUMENT_CONVERTER)
+            _converter = converter_class(**getattr(settings, 'DOCUMENT_CONVERTER_OPTIONS', {}))
+        return _converter
+
+
+def docx_to_pdf(docx_path, pdf_path=None):
+    return get_converter().convert(docx_path, pdf_path)
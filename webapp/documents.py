@@ -0,0 +1,365 @@
+import copy
+import hashlib
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from docx import Document
+from docx.image.exceptions import UnrecognizedImageError
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Inches
+from lxml import etree
+
+from .images import print_image_path
+
+EXAMINATION_TEMPLATE_PATH = os.path.join(settings.BASE_DIR, 'templates', 'examination_template.docx')
+
+CELL_PLACEHOLDERS = ('{PATIENT_NAME}', '{AGE}', '{SEX}', '{SERVICE_TYPE}', '{DATE}', '{FILE_NO}')
+FOOTER_PLACEHOLDERS = ('{DOCTOR_NAME}', '{SIGNATURE}', '{UNIQUE_CODE}')
+
+
+class CompiledTemplate:
+    """
+    The examination template parsed once, with the location of every
+    placeholder recorded so rendering never has to walk the whole document.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.document = Document(path)
+        self.text_cells = []  # (table, row, column) of cells with text placeholders
+        self.image_cells = []  # (table, row, column) of cells with {PATIENT_IMAGE}
+        self.footer_paragraphs = []  # Indexes of footer paragraphs with placeholders
+
+        seen = set()
+        for table_index, table in enumerate(self.document.tables):
+            for row_index, row in enumerate(table.rows):
+                for column_index, cell in enumerate(row.cells):
+                    # Merged cells are repeated by row.cells; record each one once
+                    if cell._tc in seen:
+                        continue
+                    seen.add(cell._tc)
+                    position = (table_index, row_index, column_index)
+                    if any(placeholder in cell.text for placeholder in CELL_PLACEHOLDERS):
+                        self.text_cells.append(position)
+                    if '{PATIENT_IMAGE}' in cell.text:
+                        self.image_cells.append(position)
+
+        footer = self.document.sections[0].footer
+        for index, paragraph in enumerate(footer.paragraphs):
+            if any(placeholder in paragraph.text for placeholder in FOOTER_PLACEHOLDERS):
+                self.footer_paragraphs.append(index)
+
+    def render(self, context):
+        """Return a filled copy of the template. The parsed template itself is never modified."""
+        # Copy the whole package: lxml elements ignore the deepcopy memo, so
+        # copying the Document wrapper alone would detach it from its part.
+        doc = copy.deepcopy(self.document.part.package).main_document_part.document
+
+        for table_index, row_index, column_index in self.text_cells:
+            cell = doc.tables[table_index].rows[row_index].cells[column_index]
+            text = cell.text
+            for placeholder in CELL_PLACEHOLDERS:
+                text = text.replace(placeholder, context[placeholder])
+            cell.text = text
+
+        for table_index, row_index, column_index in self.image_cells:
+            cell = doc.tables[table_index].rows[row_index].cells[column_index]
+            cell.text = cell.text.replace('{PATIENT_IMAGE}', '')  # Clear the placeholder text
+            if context['patient_image_path']:
+                run = cell.paragraphs[0].add_run()
+                run.add_picture(context['patient_image_path'], width=Inches(1), height=Inches(1))
+
+        footer_paragraphs = doc.sections[0].footer.paragraphs
+        for index in self.footer_paragraphs:
+            paragraph = footer_paragraphs[index]
+            if '{DOCTOR_NAME}' in paragraph.text:
+                paragraph.text = paragraph.text.replace('{DOCTOR_NAME}', context['{DOCTOR_NAME}'])
+
+            if '{SIGNATURE}' in paragraph.text:
+                paragraph.text = paragraph.text.replace('{SIGNATURE}', '')  # Clear the placeholder
+                if context['signature_image_path']:
+                    run = paragraph.add_run()
+                    run.add_picture(context['signature_image_path'], width=Inches(1), height=Inches(1))
+
+            if '{UNIQUE_CODE}' in paragraph.text:
+                paragraph.text = paragraph.text.replace('{UNIQUE_CODE}', context['{UNIQUE_CODE}'])
+
+        return doc
+
+    def render_to_bytes(self, context):
+        buffer = BytesIO()
+        self.render(context).save(buffer)
+        return buffer.getvalue()
+
+
+# Formats python-docx can embed, by leading bytes, with the extension it gives their parts
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'\xff\xd8', 'jpg', 'image/jpeg'),
+    (b'GIF8', 'gif', 'image/gif'),
+    (b'BM', 'bmp', 'image/bmp'),
+    (b'II*\x00', 'tiff', 'image/tiff'),
+    (b'MM\x00*', 'tiff', 'image/tiff'),
+)
+IMAGE_RELATIONSHIP = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+EMPTY_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"></Relationships>'
+)
+SLOT_RE = re.compile(r'<\?slot (\d+)\?>')
+ONE_INCH = Inches(1)
+
+
+def _run_xml(text):
+    """A ``w:r`` holding ``text``, built the way python-docx's ``run.text`` setter builds it."""
+    content = []
+    for index, piece in enumerate(re.split(r'(\t|\r|\n)', text)):
+        if index % 2:
+            content.append('<w:tab/>' if piece == '\t' else '<w:br/>')
+        elif piece:
+            preserve = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ''
+            content.append(f'<w:t{preserve}>{escape(piece)}</w:t>')
+    return f"<w:r>{''.join(content)}</w:r>" if content else '<w:r/>'
+
+
+def _picture_run_xml(shape_id, rid, filename):
+    """A run with a 1 x 1 inch inline picture, matching python-docx's ``add_picture``."""
+    filename = escape(filename, {'"': '&quot;'})
+    return (
+        f'<w:r><w:drawing><wp:inline {nsdecls("wp", "a", "pic", "r")}>'
+        f'<wp:extent cx="{ONE_INCH}" cy="{ONE_INCH}"/><wp:docPr id="{shape_id}" name="Picture {shape_id}"/>'
+        '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+        '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        f'<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="{filename}"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{ONE_INCH}" cy="{ONE_INCH}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"/></pic:spPr></pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+    )
+
+
+def _image_format(blob):
+    for signature, extension, content_type in IMAGE_SIGNATURES:
+        if blob.startswith(signature):
+            return extension, content_type
+    raise UnrecognizedImageError("Unsupported image format")
+
+
+class _StoryPart:
+    """The document or footer XML split into literal chunks around placeholder slots."""
+
+    def __init__(self, part, archive):
+        xml = serialize_part_xml(part.element).decode('utf-8')
+        self.chunks = SLOT_RE.split(xml)  # Literal XML at even indexes, slot numbers at odd ones
+        self.member = part.partname.membername
+        self.rels_member = part.partname.rels_uri.membername
+        self.directory = posixpath.dirname(self.member)
+        self.next_shape_id = max((int(i) for i in part.element.xpath('//@id') if i.isdigit()), default=0) + 1
+        self.used_rids = set(part.rels)
+        # The part's relationships as stored in the template, or None if it has none
+        self.rels = archive.read(self.rels_member).decode('utf-8') if self.rels_member in archive.namelist() else None
+
+    def next_rid(self, taken):
+        n = 1
+        while f'rId{n}' in self.used_rids or f'rId{n}' in taken:
+            n += 1
+        return f'rId{n}'
+
+
+class XmlTemplate:
+    """
+    The examination template compiled to raw XML, rendered by string
+    substitution without python-docx.
+
+    Placeholder cells and footer paragraphs are rewritten at compile time
+    exactly as CompiledTemplate.render rewrites them, leaving a slot where
+    the filled text goes, so both engines produce the same document.
+    Rendering joins the XML chunks with the escaped values, adds image parts
+    only when a picture is present, and appends the changed parts to a
+    prebuilt zip of every other member.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        document = Document(path)
+        self.slots = []  # (text, text placeholders, image placeholder, image context key, wrap in paragraph)
+
+        seen = set()
+        for table in document.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    if cell._tc in seen:
+                        continue
+                    seen.add(cell._tc)
+                    text = cell.text
+                    has_text = any(placeholder in text for placeholder in CELL_PLACEHOLDERS)
+                    has_image = '{PATIENT_IMAGE}' in text
+                    if has_text or has_image:
+                        # cell.text = ... replaces the cell's content with one paragraph
+                        cell._tc.clear_content()
+                        cell._tc.append(self._slot(
+                            text, CELL_PLACEHOLDERS if has_text else (),
+                            '{PATIENT_IMAGE}' if has_image else None, 'patient_image_path', True,
+                        ))
+
+        footer = document.sections[0].footer
+        for paragraph in footer.paragraphs:
+            text = paragraph.text
+            if any(placeholder in text for placeholder in FOOTER_PLACEHOLDERS):
+                # paragraph.text = ... keeps the paragraph properties and replaces the runs
+                paragraph._p.clear_content()
+                paragraph._p.append(self._slot(
+                    text, ('{DOCTOR_NAME}', '{UNIQUE_CODE}'),
+                    '{SIGNATURE}' if '{SIGNATURE}' in text else None, 'signature_image_path', False,
+                ))
+
+        with zipfile.ZipFile(path) as archive:
+            self.parts = [_StoryPart(document.part, archive), _StoryPart(footer.part, archive)]
+            dynamic = {name for part in self.parts for name in (part.member, part.rels_member)}
+            self.media_numbers = {
+                int(match.group(1)) for name in archive.namelist()
+                if (match := re.match(r'word/media/image(\d+)\.', name))
+            }
+
+            # Register every embeddable image type up front so [Content_Types].xml never changes
+            content_types = archive.read('[Content_Types].xml').decode('utf-8')
+            defaults = {}
+            for _signature, extension, content_type in IMAGE_SIGNATURES:
+                if f'Extension="{extension}"' not in content_types:
+                    defaults[extension] = f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+            content_types = content_types.replace('</Types>', ''.join(defaults.values()) + '</Types>')
+
+            static = BytesIO()
+            with zipfile.ZipFile(static, 'w', zipfile.ZIP_DEFLATED) as output:
+                for info in archive.infolist():
+                    if info.filename in dynamic:
+                        continue
+                    data = content_types.encode('utf-8') if info.filename == '[Content_Types].xml' else archive.read(info)
+                    output.writestr(info, data, compress_type=info.compress_type)
+            self.static_zip = static.getvalue()
+
+    def _slot(self, *slot):
+        self.slots.append(slot)
+        return etree.ProcessingInstruction('slot', str(len(self.slots) - 1))
+
+    def render_to_bytes(self, context):
+        members = []
+        media = {}  # Image bytes -> member name, so a repeated image is stored once
+        next_media_number = 1
+
+        for part in self.parts:
+            xml = []
+            relationships = {}
+            shape_id = part.next_shape_id
+            for index, chunk in enumerate(part.chunks):
+                if index % 2 == 0:
+                    xml.append(chunk)
+                    continue
+                text, placeholders, image_placeholder, image_key, wrap = self.slots[int(chunk)]
+                for placeholder in placeholders:
+                    text = text.replace(placeholder, context[placeholder])
+                runs = [_run_xml(text.replace(image_placeholder, '') if image_placeholder else text)]
+
+                if image_placeholder and context[image_key]:
+                    with open(context[image_key], 'rb') as f:
+                        blob = f.read()
+                    if blob not in media:
+                        extension, _content_type = _image_format(blob)
+                        while next_media_number in self.media_numbers:
+                            next_media_number += 1
+                        media[blob] = f'word/media/image{next_media_number}.{extension}'
+                        next_media_number += 1
+                        members.append((media[blob], blob))
+                    rid = part.next_rid(relationships)
+                    relationships[rid] = posixpath.relpath(media[blob], part.directory)
+                    runs.append(_picture_run_xml(shape_id, rid, os.path.basename(context[image_key])))
+                    shape_id += 1
+
+                xml.append(f"<w:p>{''.join(runs)}</w:p>" if wrap else ''.join(runs))
+
+            members.append((part.member, ''.join(xml).encode('utf-8')))
+            if relationships:
+                added = ''.join(
+                    f'<Relationship Id="{rid}" Type="{IMAGE_RELATIONSHIP}" Target="{target}"/>'
+                    for rid, target in relationships.items()
+                )
+                rels = (part.rels or EMPTY_RELATIONSHIPS).replace('</Relationships>', added + '</Relationships>')
+                members.append((part.rels_member, rels.encode('utf-8')))
+            elif part.rels is not None:
+                members.append((part.rels_member, part.rels.encode('utf-8')))
+
+        buffer = BytesIO(self.static_zip)
+        with zipfile.ZipFile(buffer, 'a', zipfile.ZIP_DEFLATED) as archive:
+            for name, data in members:
+                # Images are already compressed
+                compress_type = zipfile.ZIP_STORED if name.startswith('word/media/') else zipfile.ZIP_DEFLATED
+                archive.writestr(name, data, compress_type=compress_type)
+        return buffer.getvalue()
+
+
+TEMPLATE_ENGINES = {
+    'python-docx': CompiledTemplate,
+    'xml': XmlTemplate,
+}
+
+_template_lock = threading.Lock()
+_compiled_templates = {}
+
+
+def get_examination_template(engine=None):
+    """Return the compiled examination template, recompiling it if the file changed."""
+    engine = engine or getattr(settings, 'DOCUMENT_TEMPLATE_ENGINE', 'xml')
+    with _template_lock:
+        mtime = os.path.getmtime(EXAMINATION_TEMPLATE_PATH)
+        template = _compiled_templates.get(engine)
+        if template is None or template.mtime != mtime:
+            template = _compiled_templates[engine] = TEMPLATE_ENGINES[engine](EXAMINATION_TEMPLATE_PATH)
+        return template
+
+
+def build_examination_context(examination):
+    """Collect every value the template needs with a fixed number of queries."""
+    patient = examination.patient
+    doctor = examination.attending_doctor
+    file_number = examination.get_file_number()
+
+    # Use the stored unique code so the printed code matches the verification index
+    if not examination.unique_code:
+        examination.assign_unique_codes(file_number)
+
+    return {
+        '{PATIENT_NAME}': patient.get_full_name_with_middle_initial(),
+        '{AGE}': str(patient.age),
+        '{SEX}': patient.sex,
+        '{SERVICE_TYPE}': ', '.join(str(s) for s in examination.service_types.all()),
+        '{DATE}': examination.date_created.strftime('%B %d, %Y'),
+        '{FILE_NO}': file_number,
+        '{DOCTOR_NAME}': doctor.get_full_name_with_middle_initial(),
+        '{UNIQUE_CODE}': examination.unique_code,
+        'patient_image_path': print_image_path(patient.image),
+        'signature_image_path': print_image_path(doctor.signature_image),
+        'output_filename': f"{patient.patient_full_name_last_name_start()}.docx",
+    }
+
+
+def generate_examination_document(examination):
+    context = build_examination_context(examination)
+    # Render in memory, hashing the document for download validators
+    content = get_examination_template().render_to_bytes(context)
+
+    # Save through the storage backend so concurrent workers never overwrite each other's files
+    if examination.document:
+        examination.document.delete(save=False)
+    examination.document.save(context['output_filename'], ContentFile(content), save=False)
+    examination.document_hash = hashlib.sha256(content).hexdigest()
+    examination.document_status = examination.DOCUMENT_READY
+    examination.save(update_fields=['document', 'document_hash', 'document_status'])
@@ -0,0 +1,190 @@
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Patient
+from .typeahead import normalize
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+NON_LETTER_RE = re.compile(r'[^a-z]')
+NON_DIGIT_RE = re.compile(r'\D')
+
+# Scores at or above this are reported as likely duplicates
+DEFAULT_THRESHOLD = 0.75
+# Blocks larger than this (e.g. a shared clinic phone number) are too common to mean anything
+MAX_BLOCK_SIZE = 50
+
+
+def soundex(name):
+    """American Soundex code of a name, so 'Reyes' and 'Reis' share a key."""
+    letters = NON_LETTER_RE.sub('', normalize(name))
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'hw':  # H and W do not separate letters with the same code
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def name_key(first_name, last_name):
+    return soundex(last_name) + soundex(first_name)
+
+
+def contact_key(contact_number):
+    """The last ten digits, so '0917 123 4567' and '+63 917 123 4567' match."""
+    return NON_DIGIT_RE.sub('', contact_number or '')[-10:]
+
+
+def estimate_birth_year(age, on=None):
+    if age is None:
+        return None
+    return (on or timezone.localdate()).year - age
+
+
+def assign_blocking_keys(patient, update_birth_year=True, registered_on=None):
+    """
+    Fill in the stored keys duplicate detection looks candidates up by.
+
+    Ages are entered at registration and never aged, so the birth year is
+    only estimated (as of ``registered_on``, today by default) when asked
+    to, e.g. for a new patient or a corrected age, or when it is missing.
+    """
+    patient.name_key = name_key(patient.first_name, patient.last_name)
+    patient.contact_key = contact_key(patient.contact_number)
+    if update_birth_year or patient.birth_year is None:
+        patient.birth_year = estimate_birth_year(patient.age, registered_on)
+
+
+def _full_name(first_name, middle_name, last_name):
+    return ' '.join(normalize(name) for name in (first_name, middle_name, last_name) if name)
+
+
+def match_score(a, b):
+    """
+    How likely two patients are the same person, from 0 to 1. ``a`` and ``b``
+    need the Patient fields and blocking keys (see ``assign_blocking_keys``).
+    """
+    names = SequenceMatcher(
+        None, _full_name(a.first_name, a.middle_name, a.last_name), _full_name(b.first_name, b.middle_name, b.last_name),
+    ).ratio()
+    # Swapped first and last names are a common data entry slip
+    swapped = SequenceMatcher(
+        None, _full_name(a.first_name, None, a.last_name), _full_name(b.last_name, None, b.first_name),
+    ).ratio()
+    score = 0.65 * max(names, swapped)
+    if a.birth_year and b.birth_year and abs(a.birth_year - b.birth_year) <= 1:
+        score += 0.15
+    if a.contact_key and a.contact_key == b.contact_key:
+        score += 0.15
+    if a.sex == b.sex:
+        score += 0.05
+    return score
+
+
+def find_duplicate_patients(patient, limit=5, threshold=None):
+    """
+    Return up to ``limit`` (existing patient, score) pairs that ``patient``
+    (saved or not) probably duplicates, best match first.
+
+    Only patients sharing a block are scored: the same phonetic name key
+    and birth year give or take one, or the same contact number. Both are
+    index lookups, so the cost does not grow with the number of patients.
+    """
+    threshold = getattr(settings, 'PATIENT_DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD) if threshold is None else threshold
+    if patient.pk is None:
+        assign_blocking_keys(patient)  # A saved patient keeps its stored keys
+
+    blocks = Q(pk__in=[])
+    if patient.birth_year is not None:
+        blocks |= Q(name_key=patient.name_key, birth_year__range=(patient.birth_year - 1, patient.birth_year + 1))
+    if patient.contact_key:
+        blocks |= Q(contact_key=patient.contact_key)
+    candidates = Patient.objects.filter(blocks)
+    if patient.pk:
+        candidates = candidates.exclude(pk=patient.pk)
+
+    scored = [(candidate, match_score(patient, candidate)) for candidate in candidates[:MAX_BLOCK_SIZE]]
+    scored = [(candidate, score) for candidate, score in scored if score >= threshold]
+    scored.sort(key=lambda pair: -pair[1])
+    return scored[:limit]
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def cluster_duplicates(threshold=None):
+    """
+    Group existing patients that are probably the same person.
+
+    Patients are bucketed by phonetic name key and birth year, and by
+    contact number, in one pass; only pairs inside a bucket (or adjacent
+    birth-year buckets) are scored. Returns a list of clusters, each a list
+    of (patient id, best score linking it to the cluster) sorted by id.
+    """
+    threshold = getattr(settings, 'PATIENT_DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD) if threshold is None else threshold
+    fields = ('id', 'first_name', 'middle_name', 'last_name', 'sex', 'name_key', 'birth_year', 'contact_key')
+    patients = {}
+    by_name = defaultdict(list)
+    by_contact = defaultdict(list)
+    for patient in Patient.objects.only(*fields).order_by('id').iterator(chunk_size=2000):
+        patients[patient.id] = patient
+        by_name[(patient.name_key, patient.birth_year)].append(patient.id)
+        if patient.contact_key:
+            by_contact[patient.contact_key].append(patient.id)
+
+    pairs = set()
+    for (key, birth_year), ids in by_name.items():
+        neighbours = by_name.get((key, birth_year + 1), []) if birth_year is not None else []
+        if len(ids) + len(neighbours) > MAX_BLOCK_SIZE:
+            continue
+        block = ids + neighbours
+        pairs.update((a, b) for index, a in enumerate(ids) for b in block[index + 1:])
+    for ids in by_contact.values():
+        if len(ids) <= MAX_BLOCK_SIZE:
+            pairs.update((a, b) for index, a in enumerate(ids) for b in ids[index + 1:])
+
+    groups = _DisjointSet()
+    best = {}
+    for a, b in pairs:
+        score = match_score(patients[a], patients[b])
+        if score >= threshold:
+            groups.union(a, b)
+            best[a] = max(best.get(a, 0), score)
+            best[b] = max(best.get(b, 0), score)
+
+    clusters = defaultdict(list)
+    for patient_id in sorted(best):
+        clusters[groups.find(patient_id)].append((patient_id, best[patient_id]))
+    return list(clusters.values())
@@ -0,0 +1,203 @@
+import csv
+import re
+import zipfile
+from io import StringIO
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .models import Examination, Patient, ServiceType
+
+EXPORT_HEADERS = (
+    'File No.', 'Date', 'Patient ID', 'Patient', 'Age', 'Sex', 'Contact Number', 'Attending Doctor',
+    'Service Types', 'Payment Method', 'Amount', 'Payment Status', 'Payment Date',
+)
+# Only the columns the export needs, with one row per payment (or one for an examination without any)
+EXPORT_FIELDS = (
+    'id', 'file_number', 'date_created', 'patient_id',
+    'patient__first_name', 'patient__middle_name', 'patient__last_name', 'patient__age', 'patient__sex', 'patient__contact_number',
+    'attending_doctor__prefix', 'attending_doctor__first_name', 'attending_doctor__last_name',
+    'payment__method', 'payment__amount', 'payment__status', 'payment__date',
+)
+EXPORT_CHUNK_SIZE = 2000
+
+# Characters XML 1.0 cannot contain, e.g. stray control characters pasted into an address
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _batches(rows, size):
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_rows(examinations, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one tuple of EXPORT_HEADERS values per payment of each examination
+    in ``examinations``, oldest first.
+
+    Rows are read with a values() projection through iterator(), and the
+    service types are looked up per chunk, so memory stays the same however
+    many rows are exported.
+    """
+    rows = (
+        examinations.order_by('date_created', 'id', 'payment__id')
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    service_names = dict(ServiceType.objects.values_list('id', 'name'))
+    through = Examination.service_types.through
+    id_width = Patient.get_id_width()
+    zone = timezone.get_current_timezone()  # Looked up once rather than per row by localtime()
+
+    for chunk in _batches(rows, chunk_size):
+        services = {}
+        for examination_id, service_type_id in through.objects.filter(
+            examination_id__in={row['id'] for row in chunk}
+        ).values_list('examination_id', 'servicetype_id'):
+            services.setdefault(examination_id, []).append(service_names.get(service_type_id, ''))
+
+        for row in chunk:
+            middle_initial = f" {row['patient__middle_name'][0].upper()}." if row['patient__middle_name'] else ''
+            doctor = ' '.join(
+                name for name in (row['attending_doctor__prefix'], row['attending_doctor__first_name'], row['attending_doctor__last_name']) if name
+            )
+            yield (
+                row['file_number'] or '',
+                row['date_created'].astimezone(zone).strftime('%Y-%m-%d %H:%M'),
+                f"PID-{row['patient_id']:0{id_width}d}",
+                f"{row['patient__last_name']}, {row['patient__first_name']}{middle_initial}",
+                row['patient__age'],
+                row['patient__sex'],
+                row['patient__contact_number'],
+                doctor,
+                ', '.join(sorted(services.get(row['id'], []))),
+                row['payment__method'] or '',
+                row['payment__amount'] if row['payment__amount'] is not None else '',
+                row['payment__status'] or '',
+                row['payment__date'].astimezone(zone).strftime('%Y-%m-%d %H:%M') if row['payment__date'] else '',
+            )
+
+
+def stream_csv(rows, batch_size=500):
+    """Yield the CSV text of ``rows`` a batch at a time."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    for batch in _batches(iter(rows), batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _ChunkWriter:
+    """A write-only file for zipfile that hands back whatever was written since the last take()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def _xlsx_row(number, values):
+    cells = []
+    for index, value in enumerate(values):
+        reference = f'{_column_name(index)}{number}'
+        if isinstance(value, (int, float)) or hasattr(value, 'as_tuple'):  # Numbers and Decimals
+            cells.append(f'<c r="{reference}"><v>{value}</v></c>')
+        elif value != '':
+            text = escape(INVALID_XML_RE.sub('', str(value)))
+            cells.append(f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Examinations" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def stream_xlsx(rows, batch_size=500):
+    """
+    Yield an .xlsx workbook of ``rows`` a batch at a time. The sheet XML is
+    written straight into a deflated zip entry (no spreadsheet library, and
+    nothing held in memory beyond the current batch).
+    """
+    output = _ChunkWriter()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as package:
+        for name, content in XLSX_STATIC_PARTS.items():
+            package.writestr(name, content)
+        yield output.take()
+
+        with package.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(1, EXPORT_HEADERS).encode())
+            number = 1
+            for batch in _batches(iter(rows), batch_size):
+                lines = []
+                for values in batch:
+                    number += 1
+                    lines.append(_xlsx_row(number, values))
+                sheet.write(''.join(lines).encode())
+                yield output.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield output.take()
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'xlsx': (stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
@@ -0,0 +1,35 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .forms import ExaminationFilterForm
+from .models import Payment
+
+
+def filter_by_date_created(examinations, date_from=None, date_to=None):
+    """Examinations created from the start of local day ``date_from`` through the end of ``date_to``."""
+    # Compare against datetimes rather than __date so the date_created index is used
+    if date_from:
+        examinations = examinations.filter(date_created__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        examinations = examinations.filter(date_created__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    return examinations
+
+
+def filter_examinations(examinations, filters):
+    """Apply the cleaned ExaminationFilterForm values to an examination queryset."""
+    examinations = filter_by_date_created(examinations, filters.get('date_from'), filters.get('date_to'))
+    if filters.get('doctor'):
+        examinations = examinations.filter(attending_doctor=filters['doctor'])
+    if filters.get('service_type'):
+        examinations = examinations.filter(service_types=filters['service_type'])
+    if filters.get('payment_status'):
+        # The status shown in the list is the examination's first payment's
+        first_payment_status = Payment.objects.filter(examination=OuterRef('pk')).order_by('pk').values('status')[:1]
+        examinations = examinations.annotate(first_payment_status=Subquery(first_payment_status))
+        if filters['payment_status'] == ExaminationFilterForm.NO_PAYMENT:
+            examinations = examinations.filter(first_payment_status__isnull=True)
+        else:
+            examinations = examinations.filter(first_payment_status=filters['payment_status'])
+    return examinations
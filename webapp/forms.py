@@ -454,4 +454,39 @@ class EditExaminationForm(forms.ModelForm):
 
     class Meta:
         model = Examination
-        fields = ['service_types']
\ No newline at end of file
+        fields = ['service_types']
+
+class ExaminationFilterForm(forms.Form):
+    NO_PAYMENT = 'none'
+    PAYMENT_STATUS_CHOICES = [('', 'Any Payment Status'), ('Paid', 'Paid'), ('Pending', 'Pending'), (NO_PAYMENT, 'No Payment')]
+
+    date_from = forms.DateField(
+        required=False,
+        label="From",
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        label="To",
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    doctor = forms.ModelChoiceField(
+        queryset=CustomUser.objects.filter(Q(is_associated_doctor=True) | Q(is_clinic_doctor=True)),
+        required=False,
+        empty_label="Any Doctor",
+        label="Attending Doctor",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    service_type = forms.ModelChoiceField(
+        queryset=ServiceType.objects.all(),
+        required=False,
+        empty_label="Any Service",
+        label="Type of Service",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    payment_status = forms.ChoiceField(
+        choices=PAYMENT_STATUS_CHOICES,
+        required=False,
+        label="Payment Status",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
@@ -0,0 +1,61 @@
+import os
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .storage import file_sha256
+
+# Images are embedded in documents at 1 x 1 inch
+PRINT_INCHES = 1
+PRINT_DPI = getattr(settings, 'DOCUMENT_IMAGE_DPI', 300)
+
+
+def _derivative_root(digest):
+    size = PRINT_INCHES * PRINT_DPI
+    return os.path.join(settings.MEDIA_ROOT, 'derivatives', digest[:2], f"{digest}_{size}px")
+
+
+def ensure_print_derivative(image_field):
+    """
+    Return the path of a copy of the image resized for printing at 1 inch,
+    creating it if none exists yet for the image's content.
+
+    Derivatives are named by the SHA-256 of the source, not its file name or
+    modification time: a name reused for a new upload can be a hard link to
+    an older blob (see ContentAddressedStorage) and keep that blob's mtime.
+    """
+    source_path = image_field.path
+    root = _derivative_root(file_sha256(source_path))
+    for extension in ('.png', '.jpg'):
+        path = root + extension
+        if os.path.exists(path):
+            return path
+
+    size = PRINT_INCHES * PRINT_DPI
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if has_alpha:
+            # Webcam captures are RGBA but fully opaque; those compress far better as JPEG
+            has_alpha = image.convert('RGBA').getchannel('A').getextrema()[0] < 255
+        # Documents stretch images to a 1 x 1 inch box, so resizing to a square keeps the printed result
+        image = image.convert('RGBA' if has_alpha else 'RGB').resize((size, size), Image.LANCZOS)
+        path = root + ('.png' if has_alpha else '.jpg')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        if has_alpha:
+            image.save(temp_path, format='PNG', optimize=True, dpi=(PRINT_DPI, PRINT_DPI))
+        else:
+            image.save(temp_path, format='JPEG', quality=88, optimize=True, dpi=(PRINT_DPI, PRINT_DPI))
+        os.replace(temp_path, path)
+    return path
+
+
+def print_image_path(image_field):
+    """Path to embed in documents: the print derivative, or the original if it cannot be made."""
+    if not image_field:
+        return None
+    try:
+        return ensure_print_derivative(image_field)
+    except (OSError, ValueError):
+        return image_field.path
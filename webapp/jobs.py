@@ -0,0 +1,115 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .documents import generate_examination_document
+from .models import BackgroundJob, Examination
+from .pdf_cache import get_or_convert_pdf
+
+# Seconds after which a running job whose worker died is picked up again
+JOB_LOCK_TIMEOUT = getattr(settings, 'BACKGROUND_JOB_LOCK_TIMEOUT', 600)
+# First retry delay in seconds; doubled after every failed attempt
+JOB_RETRY_DELAY = getattr(settings, 'BACKGROUND_JOB_RETRY_DELAY', 30)
+
+TASKS = {}
+
+
+def register_task(name, on_failure=None):
+    """Register a handler taking an Examination. ``on_failure`` runs once retries are exhausted."""
+    def decorator(handler):
+        TASKS[name] = (handler, on_failure)
+        return handler
+    return decorator
+
+
+def enqueue_job(task, examination, **fields):
+    """
+    Queue a task for an examination. Called inside a transaction, the job row
+    commits (and becomes visible to workers) together with the examination.
+    With BACKGROUND_JOBS_EAGER the job runs in-process once the transaction commits.
+    """
+    if task not in TASKS:
+        raise ValueError(f"Unknown background task: {task}")
+    job = BackgroundJob.objects.create(task=task, examination=examination, **fields)
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False):
+        transaction.on_commit(lambda: run_claimed(claim_job(job.pk, 'eager')))
+    return job
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    return (
+        Q(status=BackgroundJob.QUEUED, run_after__lte=now) |
+        Q(status=BackgroundJob.RUNNING, locked_at__lt=stale)
+    )
+
+
+def claim_job(job_id, worker_id):
+    """Atomically mark a job as running for this worker. Returns None if another worker won."""
+    now = timezone.now()
+    claimed = BackgroundJob.objects.filter(_claimable(now), pk=job_id).update(
+        status=BackgroundJob.RUNNING,
+        locked_by=worker_id,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return None
+    return BackgroundJob.objects.select_related('examination').get(pk=job_id)
+
+
+def claim_next_job(worker_id, tasks=None, batch=10):
+    """Claim the oldest runnable job, or return None when the queue is empty."""
+    candidates = BackgroundJob.objects.filter(_claimable(timezone.now()))
+    if tasks:
+        candidates = candidates.filter(task__in=tasks)
+    for job_id in candidates.order_by('run_after', 'id').values_list('id', flat=True)[:batch]:
+        job = claim_job(job_id, worker_id)
+        if job is not None:
+            return job
+    return None
+
+
+def run_claimed(job):
+    """Run a claimed job and record the outcome, scheduling a retry on failure."""
+    if job is None:
+        return None
+    handler, on_failure = TASKS[job.task]
+    try:
+        handler(job.examination)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = BackgroundJob.FAILED
+            if on_failure:
+                on_failure(job.examination)
+        else:
+            job.status = BackgroundJob.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = BackgroundJob.DONE
+        job.last_error = ''
+    job.locked_by = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'last_error', 'run_after', 'locked_by', 'locked_at', 'updated_at'])
+    return job
+
+
+def _document_failed(examination):
+    Examination.objects.filter(pk=examination.pk).update(document_status=Examination.DOCUMENT_FAILED)
+
+
+@register_task('generate_document', on_failure=_document_failed)
+def generate_document_task(examination):
+    generate_examination_document(examination)
+
+
+@register_task('convert_pdf')
+def convert_pdf_task(examination):
+    if examination.edited_document:
+        document_hash = examination.original_document_hash if examination.verify_document_integrity() else None
+        get_or_convert_pdf(examination.edited_document.path, document_hash)
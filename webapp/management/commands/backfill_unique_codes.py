@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+
+from webapp.models import Examination
+
+
+class Command(BaseCommand):
+    help = "Store the CHMC and raw SHA-256 verification codes for examinations that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without saving.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        examinations = (
+            Examination.objects.filter(unique_code__isnull=True)
+            .select_related('patient', 'attending_doctor')
+            .order_by('date_created', 'id')
+        )
+
+        updated = skipped = 0
+        for examination in examinations.iterator(chunk_size=500):
+            if dry_run:
+                updated += 1
+                continue
+
+            try:
+                with transaction.atomic():
+                    examination.assign_unique_codes()
+                updated += 1
+            except IntegrityError:
+                skipped += 1
+                self.stderr.write(f"Examination {examination.id}: code collides with an existing examination, skipped.")
+
+        verb = "Would update" if dry_run else "Updated"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {updated} examination(s), skipped {skipped}."))
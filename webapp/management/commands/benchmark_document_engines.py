@@ -0,0 +1,74 @@
+import hashlib
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from docx import Document
+from docx.oxml.ns import qn
+
+from webapp.documents import TEMPLATE_ENGINES, build_examination_context, get_examination_template
+from webapp.models import Examination
+
+
+def document_contents(content):
+    """The text and embedded images of every body and footer paragraph, for comparing engines."""
+    doc = Document(BytesIO(content))
+    contents = []
+    for name, part in (('body', doc.part), ('footer', doc.sections[0].footer.part)):
+        for p in part.element.iter(qn('w:p')):
+            text = ''.join(
+                node.text or '' if node.tag == qn('w:t') else '\t' if node.tag == qn('w:tab') else '\n'
+                for node in p.iter(qn('w:t'), qn('w:tab'), qn('w:br'))
+            )
+            images = [
+                hashlib.sha256(part.related_parts[blip.get(qn('r:embed'))].blob).hexdigest()
+                for blip in p.iter(qn('a:blip'))
+            ]
+            contents.append((name, text, images))
+    return contents
+
+
+class Command(BaseCommand):
+    help = "Time each document template engine on an examination and check that their output matches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--examination', type=int, help="Examination to render (default: the most recent one).")
+        parser.add_argument('--iterations', type=int, default=50, help="Renders per engine.")
+
+    def handle(self, *args, **options):
+        examinations = Examination.objects.select_related('patient', 'attending_doctor')
+        if options['examination']:
+            examination = examinations.filter(pk=options['examination']).first()
+        else:
+            examination = examinations.order_by('-pk').first()
+        if examination is None:
+            raise CommandError("No examination to render.")
+        context = build_examination_context(examination)
+        iterations = max(1, options['iterations'])
+
+        outputs = {}
+        timings = {}
+        for engine in TEMPLATE_ENGINES:
+            started = time.perf_counter()
+            template = get_examination_template(engine)
+            compiled = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                outputs[engine] = template.render_to_bytes(context)
+            timings[engine] = (time.perf_counter() - started) / iterations
+            self.stdout.write(
+                f"{engine}: {timings[engine] * 1000:.2f} ms per document, "
+                f"{len(outputs[engine])} bytes, compiled in {compiled * 1000:.0f} ms"
+            )
+
+        baseline = timings['python-docx']
+        for engine, seconds in timings.items():
+            if engine != 'python-docx':
+                self.stdout.write(f"{engine} is {baseline / seconds:.1f}x faster than python-docx")
+
+        expected = document_contents(outputs['python-docx'])
+        for engine, content in outputs.items():
+            if document_contents(content) != expected:
+                raise CommandError(f"The {engine} engine's document does not match python-docx's.")
+        self.stdout.write(self.style.SUCCESS("All engines produced the same document."))
@@ -0,0 +1,36 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from docx import Document
+
+from webapp.converters import ConversionError, get_converter
+
+
+class Command(BaseCommand):
+    help = "Report the health of the document converter and optionally run a test conversion."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help="Also convert a small test document.")
+
+    def handle(self, *args, **options):
+        converter = get_converter()
+        status = converter.health_check()
+        self.stdout.write(f"{type(converter).__name__}: {json.dumps(status)}")
+
+        if options['convert']:
+            with tempfile.TemporaryDirectory() as directory:
+                docx_path = os.path.join(directory, 'health_check.docx')
+                doc = Document()
+                doc.add_paragraph("Converter health check")
+                doc.save(docx_path)
+                try:
+                    pdf_path = converter.convert(docx_path)
+                except ConversionError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(f"Test conversion produced {os.path.getsize(pdf_path)} bytes.")
+
+        if not status.get('ok'):
+            raise CommandError("Document converter is not healthy.")
+        self.stdout.write(self.style.SUCCESS("Document converter is healthy."))
@@ -0,0 +1,62 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp.storage import BLOB_DIR, ContentAddressedStorage, file_sha256
+
+
+class Command(BaseCommand):
+    help = "Move existing media files into the content-addressed blob store and remove unreferenced blobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report savings without changing any file.")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not ContentAddressedStorage.")
+        dry_run = options['dry_run']
+        root = default_storage.location
+        blob_root = os.path.join(root, BLOB_DIR)
+
+        linked = saved = 0
+        seen = {}
+        for directory, dirs, files in os.walk(root):
+            if os.path.abspath(directory) == os.path.abspath(root):
+                dirs[:] = [d for d in dirs if d != BLOB_DIR]
+            for filename in files:
+                path = os.path.join(directory, filename)
+                digest = file_sha256(path)
+                blob = default_storage.blob_path(digest)
+
+                if dry_run:
+                    if digest in seen:
+                        saved += os.path.getsize(path)
+                    seen[digest] = path
+                    continue
+
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.link(path, blob)
+                elif not os.path.samefile(blob, path):
+                    # Replace the duplicate with a link to the shared blob, atomically
+                    temp_path = f"{path}.dedupe.tmp"
+                    os.link(blob, temp_path)
+                    os.replace(temp_path, path)
+                    saved += os.path.getsize(blob)
+                    linked += 1
+
+        removed = 0
+        if not dry_run and os.path.isdir(blob_root):
+            for directory, _dirs, files in os.walk(blob_root):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    # Only the blob itself links to this inode: no media file references it
+                    if os.path.basename(directory) != 'tmp' and os.stat(path).st_nlink == 1:
+                        os.remove(path)
+                        removed += 1
+
+        verb = "Would save" if dry_run else "Saved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {saved / (1024 * 1024):.1f} MB; {linked} duplicate(s) linked, {removed} unreferenced blob(s) removed."
+        ))
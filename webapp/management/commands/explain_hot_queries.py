@@ -0,0 +1,74 @@
+import re
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from webapp import search
+from webapp.models import Appointment, CustomUser, Examination, Patient, Payment
+
+# A full scan of a table without an index: "SCAN webapp_payment", but not "SCAN webapp_payment USING INDEX ..."
+FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)$', re.MULTILINE)
+
+
+def hot_queries():
+    """
+    The queries the clinic runs on every page view or report, by name. Each
+    is a queryset, or (sql, params) for raw SQL such as the full-text search.
+    """
+    now = timezone.now()
+    today = timezone.localdate()
+    start_of_day = timezone.make_aware(datetime.combine(today, time.min))
+    return {
+        "examination list page": Examination.objects.order_by('-date_created', '-id')[:26],
+        "examination list for one doctor": Examination.objects.filter(attending_doctor_id=1).order_by('-date_created', '-id')[:26],
+        "examinations in a year": Examination.objects.filter(date_created__year=today.year),
+        "clinic doctor exists": CustomUser.objects.filter(is_clinic_doctor=True).values('id')[:1],
+        "associated doctors": CustomUser.objects.filter(is_associated_doctor=True),
+        "doctor choices": CustomUser.objects.filter(Q(is_associated_doctor=True) | Q(is_clinic_doctor=True)),
+        "employees": CustomUser.objects.filter(is_employee=True),
+        "income by method this week": Payment.objects.filter(date__gte=now - timedelta(days=7), status='Paid')
+            .values('method').annotate(total=Sum('amount'), count=Count('id')),
+        # A range on the column itself, not date__date, so the index on date applies
+        "cash payments today": Payment.objects.filter(date__gte=start_of_day, date__lt=start_of_day + timedelta(days=1), method='Cash'),
+        "pending payments": Payment.objects.filter(status='Pending').order_by('date'),
+        "appointments today": Appointment.objects.filter(appointment_date=today).order_by('appointment_time'),
+        "patient name search": (
+            f"SELECT rowid FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s", ['"ga"*', 10],
+        ) if search.uses_fts() else Patient.objects.filter(last_name__istartswith='ga').order_by('last_name', 'first_name', 'id')[:10],
+        "duplicate candidates": Patient.objects.filter(
+            Q(name_key='G120A365', birth_year__range=(2000, 2002)) | Q(contact_key='9170000000')
+        ),
+    }
+
+
+def explain_sql(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(connection.ops.explain_query_prefix() + ' ' + sql, params)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = "Print the database's query plan for each hot query, so a missing or unused index shows up."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help="Exit with an error if any plan scans a whole table (SQLite only).")
+
+    def handle(self, *args, **options):
+        scans = []
+        for name, queryset in hot_queries().items():
+            # On SQLite this is EXPLAIN QUERY PLAN; other databases print their own EXPLAIN
+            plan = explain_sql(*queryset) if isinstance(queryset, tuple) else queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            self.stdout.write("")
+            if connection.vendor == 'sqlite':
+                scans.extend(f"{name}: {table}" for table in FULL_SCAN_RE.findall(plan))
+
+        if options['fail_on_scan'] and scans:
+            raise CommandError("Full table scans in hot queries:\n" + "\n".join(scans))
+        if scans:
+            self.stdout.write(self.style.WARNING("Full table scans:\n" + "\n".join(scans)))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from webapp.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_rows
+from webapp.filters import filter_examinations
+from webapp.forms import ExaminationFilterForm
+from webapp.models import Examination
+
+
+class Command(BaseCommand):
+    help = "Export examinations in a date range, one row per payment, as CSV or XLSX (e.g. for month-end reconciliation)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write; CSV goes to standard output if omitted.")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="Rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        filter_form = ExaminationFilterForm({'date_from': options['date_from'], 'date_to': options['date_to']})
+        if not filter_form.is_valid():
+            raise CommandError(filter_form.errors.as_text())
+        if options['format'] == 'xlsx' and not options['output']:
+            raise CommandError("XLSX exports need --output.")
+
+        stream = EXPORT_FORMATS[options['format']][0]
+        rows = export_rows(filter_examinations(Examination.objects.all(), filter_form.cleaned_data), chunk_size=options['chunk_size'])
+        if not options['output']:
+            for text in stream(rows):
+                self.stdout.write(text, ending='')
+            return
+
+        mode = 'w' if options['format'] == 'csv' else 'wb'
+        with open(options['output'], mode, newline='' if mode == 'w' else None) as output:
+            for data in stream(rows):
+                output.write(data)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
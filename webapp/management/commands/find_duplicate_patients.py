@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from webapp.duplicates import DEFAULT_THRESHOLD, assign_blocking_keys, cluster_duplicates
+from webapp.models import Patient
+
+
+class Command(BaseCommand):
+    help = "List groups of patient records that probably belong to the same person."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=None,
+                            help=f"Minimum match score from 0 to 1 (default: PATIENT_DUPLICATE_THRESHOLD or {DEFAULT_THRESHOLD}).")
+        parser.add_argument('--refresh-keys', action='store_true',
+                            help="Recompute every patient's name and contact keys first, e.g. after bulk updates that bypass model signals. "
+                                 "Missing birth years are estimated from the first examination's date.")
+        parser.add_argument('--output', help="Also write the clusters to this JSON file.")
+
+    def handle(self, *args, **options):
+        if options['refresh_keys']:
+            batch = []
+            patients = Patient.objects.annotate(first_seen=Min('examinations__date_created'))
+            for patient in patients.iterator(chunk_size=2000):
+                # Stored birth years are kept; ages were entered at registration, not today
+                registered_on = timezone.localdate(patient.first_seen) if patient.first_seen else None
+                assign_blocking_keys(patient, update_birth_year=False, registered_on=registered_on)
+                batch.append(patient)
+                if len(batch) >= 2000:
+                    Patient.objects.bulk_update(batch, ['name_key', 'contact_key', 'birth_year'])
+                    batch = []
+            Patient.objects.bulk_update(batch, ['name_key', 'contact_key', 'birth_year'])
+
+        clusters = cluster_duplicates(threshold=options['threshold'])
+        names = Patient.objects.in_bulk([patient_id for cluster in clusters for patient_id, _score in cluster])
+
+        report = []
+        for cluster in clusters:
+            members = [
+                {"id": patient_id, "patient": names[patient_id].get_full_name_with_middle_initial(), "score": round(score, 3)}
+                for patient_id, score in cluster
+            ]
+            report.append(members)
+            self.stdout.write(", ".join(f"{member['id']} {member['patient']} ({member['score']})" for member in members))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        total = sum(len(cluster) for cluster in clusters)
+        self.stdout.write(self.style.SUCCESS(f"Found {len(clusters)} group(s) covering {total} patient record(s)."))
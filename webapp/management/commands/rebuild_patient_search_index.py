@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from webapp import search
+from webapp.models import Patient
+
+
+class Command(BaseCommand):
+    help = "Rebuild the patient search index, e.g. after bulk updates that bypass model signals."
+
+    def handle(self, *args, **options):
+        if not search.uses_fts():
+            self.stdout.write("This database searches patients without an index; nothing to rebuild.")
+            return
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Patient.objects.count()} patient(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from webapp import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily payment rollups from all payments, e.g. after bulk updates that bypass model signals."
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily rollup row(s)."))
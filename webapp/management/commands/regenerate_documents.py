@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from webapp.filters import filter_by_date_created
+from webapp.models import Examination
+
+
+def _init_worker():
+    import django
+    django.setup()  # No-op when the worker was forked from this command
+    # Never share the parent's database connections across processes
+    connections.close_all()
+    from webapp.documents import get_examination_template
+    get_examination_template()  # Compile the template once per worker
+
+
+def _regenerate_chunk(examination_ids):
+    """Regenerate the documents for one chunk of examinations. Runs in a worker process."""
+    from webapp.documents import generate_examination_document
+
+    examinations = (
+        Examination.objects.filter(id__in=examination_ids)
+        .select_related('patient', 'attending_doctor')
+        .prefetch_related('service_types')
+    )
+    done, failed = [], []
+    for examination in examinations:
+        try:
+            generate_examination_document(examination)
+            done.append(examination.id)
+        except Exception as e:
+            failed.append((examination.id, str(e)))
+    return done, failed
+
+
+class Command(BaseCommand):
+    help = "Regenerate examination documents in parallel, e.g. after the template or a doctor's signature changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="First examination date to include (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', help="Last examination date to include (YYYY-MM-DD).")
+        parser.add_argument('--doctor', type=int, help="Only examinations attended by this doctor (user ID).")
+        parser.add_argument('--ids', nargs='+', type=int, help="Only these examination IDs.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+        parser.add_argument('--chunk-size', type=int, default=50, help="Examinations handed to a worker at a time.")
+        parser.add_argument('--state-file',
+                            help="File recording finished examinations so an interrupted run can resume "
+                                 "(default: one file per selection of examinations, in BASE_DIR).")
+        parser.add_argument('--restart', action='store_true', help="Ignore the state file of a previous run.")
+
+    def _parse_date(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+    def _read_state(self, state_file, selection):
+        """Return the examinations a previous run over the same selection finished."""
+        with open(state_file) as f:
+            header = f.readline()
+            if header.strip() != f"# {selection}":
+                raise CommandError(
+                    f"{state_file} was written for a different selection of examinations "
+                    f"({header.strip('# ').strip() or 'unknown'}). Pass --restart to start over."
+                )
+            return {int(line) for line in f if line.strip()}
+
+    def handle(self, *args, **options):
+        date_from = self._parse_date(options['date_from']) if options['date_from'] else None
+        date_to = self._parse_date(options['date_to']) if options['date_to'] else None
+
+        examinations = filter_by_date_created(Examination.objects.order_by('id'), date_from, date_to)
+        if options['doctor']:
+            examinations = examinations.filter(attending_doctor_id=options['doctor'])
+        if options['ids']:
+            examinations = examinations.filter(id__in=options['ids'])
+
+        # Recorded in the state file, so a run never resumes from another selection's progress
+        selection = json.dumps({
+            'from': date_from.isoformat() if date_from else None,
+            'to': date_to.isoformat() if date_to else None,
+            'doctor': options['doctor'],
+            'ids': sorted(set(options['ids'])) if options['ids'] else None,
+        }, sort_keys=True)
+        state_file = options['state_file'] or os.path.join(
+            settings.BASE_DIR, f"regenerate_documents-{hashlib.sha256(selection.encode()).hexdigest()[:12]}.state"
+        )
+        resuming = os.path.exists(state_file) and not options['restart']
+        finished = set()
+        if resuming:
+            finished = self._read_state(state_file, selection)
+            self.stdout.write(f"Resuming: {len(finished)} examination(s) already regenerated.")
+
+        pending = [pk for pk in examinations.values_list('id', flat=True) if pk not in finished]
+        if not pending:
+            self.stdout.write(self.style.SUCCESS("Nothing to regenerate."))
+            return
+
+        chunk_size = max(1, options['chunk_size'])
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        self.stdout.write(f"Regenerating {len(pending)} document(s) in {len(chunks)} chunk(s) with {options['workers']} worker(s).")
+
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        started = time.monotonic()
+        done_count = 0
+        failures = []
+        with open(state_file, 'a' if resuming else 'w') as state, \
+                ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            if not resuming:
+                state.write(f"# {selection}\n")
+            futures = {pool.submit(_regenerate_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    done, failed = future.result()
+                except Exception as e:
+                    # e.g. a worker that died; its examinations stay pending for the next run
+                    done, failed = [], [(pk, str(e) or type(e).__name__) for pk in futures[future]]
+                state.writelines(f"{pk}\n" for pk in done)
+                state.flush()
+                done_count += len(done)
+                failures.extend(failed)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"{done_count}/{len(pending)} done, {done_count / elapsed:.1f} documents/s")
+
+        for pk, error in failures:
+            self.stderr.write(f"Examination {pk}: {error}")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Regenerated {done_count} document(s) in {elapsed:.1f}s "
+            f"({done_count / elapsed if elapsed else 0:.1f} documents/s), {len(failures)} failure(s)."
+        ))
+        if not failures:
+            os.remove(state_file)
@@ -0,0 +1,43 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from webapp.jobs import TASKS, claim_next_job, run_claimed
+from webapp.models import BackgroundJob
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (such as examination document generation) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty instead of waiting for new jobs.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--task', action='append', choices=sorted(TASKS), help="Only run jobs of this task (repeatable).")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Worker {worker_id} started.")
+
+        processed = 0
+        try:
+            while True:
+                job = claim_next_job(worker_id, tasks=options['task'])
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                job = run_claimed(job)
+                processed += 1
+                if job.status == BackgroundJob.DONE:
+                    self.stdout.write(f"Job {job.id} ({job.task}) for examination {job.examination_id} done.")
+                else:
+                    self.stderr.write(f"Job {job.id} ({job.task}) for examination {job.examination_id} {job.status} "
+                                      f"after attempt {job.attempts}/{job.max_attempts}.")
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker_id} stopped after {processed} job(s)."))
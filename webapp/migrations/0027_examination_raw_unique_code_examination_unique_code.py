@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0026_alter_payment_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examination',
+            name='raw_unique_code',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='examination',
+            name='unique_code',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+def number_existing_examinations(apps, schema_editor):
+    """Store the file number each existing document was printed with and seed the sequences.
+
+    When the n-th examination of a year was generated, the year's count
+    already included it, so the number printed on its document was n + 1.
+    """
+    Examination = apps.get_model('webapp', 'Examination')
+    FileNumberSequence = apps.get_model('webapp', 'FileNumberSequence')
+
+    last_numbers = {}
+    for examination in Examination.objects.order_by('date_created', 'id').iterator():
+        year = examination.date_created.year
+        last_numbers[year] = last_numbers.get(year, 1) + 1
+        file_number = f"{examination.date_created.strftime('%y')}-{last_numbers[year]:02d}"
+        Examination.objects.filter(pk=examination.pk).update(file_number=file_number)
+
+    for year, last_number in last_numbers.items():
+        FileNumberSequence.objects.create(year=year, last_number=last_number)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0027_examination_raw_unique_code_examination_unique_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileNumberSequence',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='examination',
+            name='file_number',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_examinations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:00
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def store_secure_hashed_ids(apps, schema_editor):
+    """Store the hashed ID each existing patient currently has."""
+    Patient = apps.get_model('webapp', 'Patient')
+    num_digits = len(str(Patient.objects.count())) + 1
+    for patient in Patient.objects.only('id').iterator():
+        to_hash = f"Patient2025PID-{patient.id:0{num_digits}d}Identity2024"
+        hashed_id = hashlib.sha256(to_hash.encode()).hexdigest()
+        Patient.objects.filter(pk=patient.pk).update(secure_hashed_id=hashed_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0028_filenumbersequence_examination_file_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='secure_hashed_id',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(store_secure_hashed_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_existing_document_status(apps, schema_editor):
+    """Existing examinations were generated synchronously: ready if they have a document."""
+    Examination = apps.get_model('webapp', 'Examination')
+    has_document = models.Q(document__isnull=False) & ~models.Q(document='')
+    Examination.objects.filter(has_document).update(document_status='ready')
+    Examination.objects.exclude(has_document).update(document_status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0029_patient_secure_hashed_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examination',
+            name='document_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=100)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('examination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='webapp.examination')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='webapp_back_status_9a2713_idx')],
+            },
+        ),
+        migrations.RunPython(set_existing_document_status, migrations.RunPython.noop),
+    ]
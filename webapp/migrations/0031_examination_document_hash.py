@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0030_examination_document_status_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examination',
+            name='document_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
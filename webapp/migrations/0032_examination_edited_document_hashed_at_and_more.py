@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0031_examination_document_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examination',
+            name='edited_document_hashed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='examination',
+            name='edited_document_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0032_examination_edited_document_hashed_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examination',
+            index=models.Index(fields=['-date_created', '-id'], name='exam_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examination',
+            index=models.Index(fields=['attending_doctor', '-date_created', '-id'], name='exam_doctor_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 patient name index (SQLite only; other databases search with the ORM)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS webapp_patient_search USING fts5("
+        "first_name, middle_name, last_name, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO webapp_patient_search (rowid, first_name, middle_name, last_name) "
+        "SELECT id, first_name, COALESCE(middle_name, ''), last_name FROM webapp_patient"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS webapp_patient_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0033_examination_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+
+# Copied from webapp.duplicates as it was when this migration was written, so later
+# changes to that module do not change what this migration stores.
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+
+def soundex(name):
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    letters = re.sub(r'[^a-z]', '', text)
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def name_key(first_name, last_name):
+    return soundex(last_name) + soundex(first_name)
+
+
+def contact_key(contact_number):
+    return re.sub(r'\D', '', contact_number or '')[-10:]
+
+
+def fill_duplicate_keys(apps, schema_editor):
+    """Ages were recorded at registration, so estimate birth years from the first examination's date."""
+    Patient = apps.get_model('webapp', 'Patient')
+    patients = Patient.objects.annotate(first_seen=Min('examinations__date_created')).iterator(chunk_size=2000)
+    today = timezone.localdate()
+    batch = []
+    for patient in patients:
+        patient.name_key = name_key(patient.first_name, patient.last_name)
+        patient.contact_key = contact_key(patient.contact_number)
+        registered_on = timezone.localdate(patient.first_seen) if patient.first_seen else today
+        patient.birth_year = registered_on.year - patient.age if patient.age is not None else None
+        batch.append(patient)
+        if len(batch) >= 2000:
+            Patient.objects.bulk_update(batch, ['name_key', 'contact_key', 'birth_year'])
+            batch = []
+    Patient.objects.bulk_update(batch, ['name_key', 'contact_key', 'birth_year'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0034_patient_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='birth_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='contact_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='name_key',
+            field=models.CharField(blank=True, editable=False, max_length=8),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['name_key', 'birth_year'], name='patient_name_key_idx'),
+        ),
+        migrations.RunPython(fill_duplicate_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:25
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    Payment = apps.get_model('webapp', 'Payment')
+    DailyPaymentRollup = apps.get_model('webapp', 'DailyPaymentRollup')
+    rows = (
+        Payment.objects.annotate(day=TruncDate('date'))
+        .values('day', 'method', 'status')
+        .annotate(amount=Sum('amount'), payment_count=Count('id'), patient_count=Count('examination__patient', distinct=True))
+        .order_by()
+    )
+    DailyPaymentRollup.objects.bulk_create([
+        DailyPaymentRollup(
+            date=row['day'], method=row['method'], status=row['status'], amount=row['amount'],
+            payment_count=row['payment_count'], patient_count=row['patient_count'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0036_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('method', models.CharField(choices=[('Cash', 'Cash'), ('Gcash', 'GCash')], max_length=10)),
+                ('status', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('patient_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'method', 'status'), name='unique_daily_payment_rollup')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
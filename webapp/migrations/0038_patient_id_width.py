@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+def store_id_width(apps, schema_editor):
+    """Keep the width patients' IDs are shown (and were hashed) with now."""
+    Patient = apps.get_model('webapp', 'Patient')
+    PatientIdWidth = apps.get_model('webapp', 'PatientIdWidth')
+    PatientIdWidth.objects.create(pk=1, digits=len(str(Patient.objects.count())) + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0037_daily_payment_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientIdWidth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digits', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.RunPython(store_id_width, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0038_patient_id_width'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examination',
+            name='unique_code_assigned_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -1,6 +1,10 @@
 import hashlib
 import base64
-from django.db import models
+import os
+import time
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Prefetch, Q, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.contrib.auth.models import User, AbstractUser, BaseUserManager
 from django.conf import settings
@@ -38,6 +42,36 @@ class ServiceType(models.Model):
     def __str__(self):
         return self.name
 
+class PatientIdWidth(models.Model):
+    """
+    Digits in formatted patient IDs, shared by every worker process. The
+    single row only ever grows, so an ID keeps its form once it was shown
+    or hashed.
+    """
+    digits = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return str(self.digits)
+
+    @classmethod
+    def grow(cls, digits):
+        """Raise the stored width to at least ``digits`` and return the stored width."""
+        with transaction.atomic():
+            if not cls.objects.filter(pk=1).update(digits=Greatest('digits', Value(digits))):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(pk=1, digits=digits)
+                    return digits
+                except IntegrityError:
+                    # Another worker created the row first
+                    cls.objects.filter(pk=1).update(digits=Greatest('digits', Value(digits)))
+            return cls.objects.get(pk=1).digits
+
+
+# Width last read from PatientIdWidth by this process, and when
+_id_width = (None, 0.0)
+
+
 class Patient(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -47,7 +81,18 @@ class Patient(models.Model):
     address = models.TextField()
     contact_number = models.CharField(max_length=15)
     image = models.ImageField(upload_to='patient_images/', blank=True, null=True)
+    secure_hashed_id = models.CharField(max_length=64, blank=True, null=True, editable=False, db_index=True)  # Stored at creation
+    # Blocking keys for duplicate detection, kept current by signals (see webapp/duplicates.py)
+    name_key = models.CharField(max_length=8, blank=True, editable=False)
+    birth_year = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+    contact_key = models.CharField(max_length=15, blank=True, editable=False, db_index=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name_key', 'birth_year'], name='patient_name_key_idx'),
+            # Name prefix lookups and alphabetical lists when not using the full-text index
+            models.Index(fields=['last_name', 'first_name'], name='patient_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"  # Returns full name
@@ -62,16 +107,46 @@ class Patient(models.Model):
         full_name = f"{self.last_name}, {self.first_name} {middle_initial}".strip()
         return full_name
     
-    def get_formatted_id(self):
-    # Determine the required number of digits based on total patient count
-        total_patients = Patient.objects.count()
-        num_digits = len(str(total_patients)) + 1  # One extra digit to future-proof
-        return f"PID-{self.id:0{num_digits}d}"
+    @classmethod
+    def required_id_width(cls):
+        """Digits needed for the current patient count, with one extra digit to future-proof."""
+        return len(str(cls.objects.count())) + 1
+
+    @classmethod
+    def get_id_width(cls, refresh=False):
+        """Return the number of digits used in formatted patient IDs.
+
+        Uses settings.PATIENT_ID_WIDTH when configured, otherwise the width
+        stored in PatientIdWidth, re-read at most once per
+        PATIENT_ID_WIDTH_REFRESH_INTERVAL seconds (or now, with ``refresh``).
+        """
+        global _id_width
+        fixed_width = getattr(settings, 'PATIENT_ID_WIDTH', None)
+        if fixed_width:
+            return fixed_width
+        num_digits, read_at = _id_width
+        now = time.monotonic()
+        if refresh or num_digits is None or now - read_at > getattr(settings, 'PATIENT_ID_WIDTH_REFRESH_INTERVAL', 5):
+            num_digits = PatientIdWidth.objects.filter(pk=1).values_list('digits', flat=True).first()
+            if num_digits is None:
+                num_digits = PatientIdWidth.grow(cls.required_id_width())
+            _id_width = (num_digits, now)
+        return num_digits
+
+    def get_formatted_id(self, refresh=False):
+        return f"PID-{self.id:0{Patient.get_id_width(refresh)}d}"
+
     def get_secure_hashed_id(self):
         """Return the SHA-256 hash of the formatted ID with salt and pepper."""
+        if self.secure_hashed_id:
+            return self.secure_hashed_id
+        return self.build_secure_hashed_id()
+
+    def build_secure_hashed_id(self):
         salt = "Patient2025"
         pepper = "Identity2024"
-        formatted_id = self.get_formatted_id()
+        # Stored permanently, so never from a width this process read earlier
+        formatted_id = self.get_formatted_id(refresh=True)
         to_hash = f"{salt}{formatted_id}{pepper}"
         hashed_id = hashlib.sha256(to_hash.encode()).hexdigest()
         return hashed_id
@@ -101,6 +176,14 @@ class CustomUser(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Partial indexes over the small slice of accounts each role filter selects. Doctor
+            # dropdowns list both kinds of doctor, and one index serves those and each kind alone.
+            models.Index(fields=['last_name', 'first_name'], condition=Q(is_associated_doctor=True) | Q(is_clinic_doctor=True), name='user_doctor_idx'),
+            models.Index(fields=['last_name', 'first_name'], condition=Q(is_employee=True), name='user_employee_idx'),
+        ]
+
     def __str__(self):
         return f"{self.email} ({self.get_full_name()})"
     
@@ -119,6 +202,11 @@ class Appointment(models.Model):
     appointment_time = models.TimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['appointment_date', 'appointment_time'], name='appointment_date_time_idx'),
+        ]
+
     def __str__(self):
         return f"Appointment for {self.client_name} on {self.appointment_date}"
 
@@ -130,17 +218,71 @@ class AppointmentServiceType(models.Model):
         return f"{self.appointment} - {self.service_type}"
     
     
+class FileNumberSequence(models.Model):
+    """Last file number handed out for each year."""
+    year = models.PositiveIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+
+    @classmethod
+    def allocate(cls, year):
+        """Atomically reserve and return the next file number for the year."""
+        with transaction.atomic():
+            # The UPDATE takes the row (or database) write lock, so concurrent
+            # workers are serialized and never receive the same number.
+            if not cls.objects.filter(year=year).update(last_number=F('last_number') + 1):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(year=year, last_number=1)
+                    return 1
+                except IntegrityError:
+                    # Another worker created the row first; take the next number from it
+                    cls.objects.filter(year=year).update(last_number=F('last_number') + 1)
+            return cls.objects.get(year=year).last_number
+
+
+# Codes tried per examination before giving up; each collides with probability (examinations / 2**32)
+UNIQUE_CODE_ATTEMPTS = 10
+
+
 class Examination(models.Model):
+    DOCUMENT_PENDING = 'pending'
+    DOCUMENT_READY = 'ready'
+    DOCUMENT_FAILED = 'failed'
+    DOCUMENT_STATUS_CHOICES = [
+        (DOCUMENT_PENDING, 'Pending'),
+        (DOCUMENT_READY, 'Ready'),
+        (DOCUMENT_FAILED, 'Failed'),
+    ]
+
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='examinations', default=1)
     service_types = models.ManyToManyField(ServiceType)
     attending_doctor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     date_created = models.DateTimeField(auto_now_add=True)
     document = models.FileField(upload_to='examination_documents/', null=True, blank=True)
+    document_hash = models.CharField(max_length=64, null=True, blank=True)  # SHA-256 of the generated document
     edited_document = models.FileField(upload_to='examination_documents/edited', null=True, blank=True)  # Edited document
     original_document_hash = models.CharField(max_length=64, null=True, blank=True)
+    edited_document_size = models.PositiveBigIntegerField(null=True, blank=True)  # Size in bytes when it was hashed
+    edited_document_hashed_at = models.DateTimeField(null=True, blank=True)
     result_image = models.ImageField(upload_to='examination_results/', null=True, blank=True)  # New field for result image
+    file_number = models.CharField(max_length=12, unique=True, null=True, blank=True, editable=False)  # Allocated from FileNumberSequence, e.g. '25-01'
+    unique_code = models.CharField(max_length=13, unique=True, null=True, blank=True, editable=False)  # CHMC-XXXXXXXX printed on the document
+    raw_unique_code = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)  # Full SHA-256 of the code
+    unique_code_assigned_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)  # For the issued-code filter's refresh
+    document_status = models.CharField(max_length=10, choices=DOCUMENT_STATUS_CHOICES, default=DOCUMENT_PENDING)  # Set by the background job
 
-    def calculate_document_hash(self, file_path):
+    class Meta:
+        indexes = [
+            # Keyset pagination of the examination list, newest first, optionally per doctor
+            models.Index(fields=['-date_created', '-id'], name='exam_created_id_idx'),
+            models.Index(fields=['attending_doctor', '-date_created', '-id'], name='exam_doctor_created_idx'),
+        ]
+
+    @staticmethod
+    def calculate_document_hash(file_path):
         """Calculate SHA-256 hash of a file."""
         hasher = hashlib.sha256()
         with open(file_path, 'rb') as f:
@@ -151,50 +293,155 @@ class Examination(models.Model):
     def save_original_document_hash(self):
         """Save the hash of the original document."""
         if self.edited_document:
-            self.original_document_hash = self.calculate_document_hash(self.edited_document.path)
-            self.save()
+            self.record_document_hash(
+                self.calculate_document_hash(self.edited_document.path),
+                os.path.getsize(self.edited_document.path),
+            )
+
+    def record_document_hash(self, document_hash, size):
+        """Store the hash and size of the edited document, e.g. as computed while it was uploaded."""
+        self.original_document_hash = document_hash
+        self.edited_document_size = size
+        self.edited_document_hashed_at = timezone.now()
+        self.save(update_fields=['original_document_hash', 'edited_document_size', 'edited_document_hashed_at'])
 
-    def verify_document_integrity(self):
-        """Verify if the document has changed by comparing hashes."""
+    def verify_document_integrity(self, deep=False):
+        """
+        Verify if the document has changed. By default the file's size and
+        modification time are compared with the stored metadata; ``deep``
+        re-reads the file and compares hashes.
+        """
         if not self.edited_document or not self.original_document_hash:
             return False  # Document integrity cannot be verified
-        current_hash = self.calculate_document_hash(self.edited_document.path)
-        return current_hash == self.original_document_hash
+        if deep or self.edited_document_size is None or self.edited_document_hashed_at is None:
+            current_hash = self.calculate_document_hash(self.edited_document.path)
+            return current_hash == self.original_document_hash
+        try:
+            stat = os.stat(self.edited_document.path)
+        except FileNotFoundError:
+            return False
+        return (
+            stat.st_size == self.edited_document_size
+            and stat.st_mtime <= self.edited_document_hashed_at.timestamp()
+        )
 
     def has_edited_document(self):
         return bool(self.edited_document)
+
+    @staticmethod
+    def prefetch_payments():
+        """Prefetch for examination lists, so primary_payment costs no query per row."""
+        return Prefetch('payment_set', queryset=Payment.objects.order_by('pk'), to_attr='prefetched_payments')
+
+    @property
+    def primary_payment(self):
+        """The examination's first payment, or None if it has no payment."""
+        payments = getattr(self, 'prefetched_payments', None)
+        if payments is None:
+            return self.payment_set.order_by('pk').first()
+        return payments[0] if payments else None
+
     def __str__(self):
         return f"Examination for {self.patient}"
     
-    def get_file_number(self):
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.file_number:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.assign_file_number()
+
+    def assign_file_number(self):
+        """Allocate the next file number for the examination's year and store it."""
         year_suffix = self.date_created.strftime("%y")  # Get the last two digits of the year
-        file_count = Examination.objects.filter(
-            date_created__year=self.date_created.year
-        ).count() + 1  # Count examinations for the current year and increment by 1
-        return f"{year_suffix}-{file_count:02d}"  # Format as '25-01', '25-02', etc.
+        file_count = FileNumberSequence.allocate(self.date_created.year)
+        self.file_number = f"{year_suffix}-{file_count:02d}"  # Format as '25-01', '25-02', etc.
+        Examination.objects.filter(pk=self.pk).update(file_number=self.file_number)
+
+    def get_file_number(self):
+        if not self.file_number:
+            self.assign_file_number()
+        return self.file_number
     
-    def get_unique_code(self):
+    def build_raw_unique_code(self, file_number, attempt=0):
+        """Return the full SHA-256 verification code for the given file number."""
         salt = "CHMC2024"
         pepper = "WBMS2025"
-        file_number = self.get_file_number()
         patient_full_name = self.patient.get_full_name_with_middle_initial()
         doctor_full_name = self.attending_doctor.get_full_name_with_middle_initial()
         raw_code = f"{file_number}-{patient_full_name}-{doctor_full_name}"
+        if attempt:
+            raw_code = f"{raw_code}-{attempt}"  # The first attempt keeps the original codes
         sha_input = f"{salt}{raw_code}{pepper}".encode('utf-8')
-        unique_code = hashlib.sha256(sha_input).hexdigest()[:8].upper()
-        return f"CHMC-{unique_code}"
+        return hashlib.sha256(sha_input).hexdigest()
+
+    def assign_unique_codes(self, file_number=None):
+        """
+        Compute the verification codes once and store them for indexed lookups.
+
+        The printed code is only the first 32 bits of the hash, so it can
+        collide with another examination's; the hash is then recomputed with
+        a counter until the code is free.
+        """
+        if file_number is None:
+            file_number = self.get_file_number()
+        for attempt in range(UNIQUE_CODE_ATTEMPTS):
+            self.raw_unique_code = self.build_raw_unique_code(file_number, attempt)
+            self.unique_code = f"CHMC-{self.raw_unique_code[:8].upper()}"
+            self.unique_code_assigned_at = timezone.now()
+            try:
+                # A savepoint, so a collision does not break the caller's transaction
+                with transaction.atomic():
+                    self.save(update_fields=['unique_code', 'raw_unique_code', 'unique_code_assigned_at'])
+                return
+            except IntegrityError:
+                continue
+        self.unique_code = self.raw_unique_code = self.unique_code_assigned_at = None
+        raise IntegrityError(f"No free verification code for examination {self.pk} after {UNIQUE_CODE_ATTEMPTS} attempts.")
+
+    def get_unique_code(self):
+        if self.unique_code:
+            return self.unique_code
+        return f"CHMC-{self.get_raw_unique_code()[:8].upper()}"
 
     # Optional: Full SHA-256 unique code (if needed)
     def get_raw_unique_code(self):
-        salt = "CHMC2024"
-        pepper = "WBMS2025"
-        file_number = self.get_file_number()
-        patient_full_name = self.patient.get_full_name_with_middle_initial()
-        doctor_full_name = self.attending_doctor.get_full_name_with_middle_initial()
-        raw_code = f"{file_number}-{patient_full_name}-{doctor_full_name}"
-        sha_input = f"{salt}{raw_code}{pepper}".encode('utf-8')
-        return hashlib.sha256(sha_input).hexdigest()
+        if self.raw_unique_code:
+            return self.raw_unique_code
+        return self.build_raw_unique_code(self.get_file_number())
     
+class BackgroundJob(models.Model):
+    """A unit of work for an examination, run by the run_job_worker command."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=50)
+    examination = models.ForeignKey(Examination, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)  # Pushed back after each failed attempt
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"{self.task} for examination {self.examination_id} ({self.status})"
+
+
 class Payment(models.Model):
     PAYMENT_METHODS = [
         ('Cash', 'Cash'),
@@ -206,5 +453,30 @@ class Payment(models.Model):
     method = models.CharField(max_length=10, choices=PAYMENT_METHODS, default='Cash')  # Payment method
     status = models.CharField(max_length=100, choices=[('Paid', 'Paid'), ('Pending', 'Pending')], default='Pending')
 
+    class Meta:
+        indexes = [
+            # Income totals by date range and method, and pending payments oldest first
+            models.Index(fields=['date', 'method', 'status'], name='payment_date_method_idx'),
+            models.Index(fields=['status', 'date'], name='payment_status_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.examination.id} - {self.amount} via {self.get_method_display()}"
+
+
+class DailyPaymentRollup(models.Model):
+    """Payment totals for one day, method and status, kept current by signals (see webapp/rollups.py)."""
+    date = models.DateField()
+    method = models.CharField(max_length=10, choices=Payment.PAYMENT_METHODS)
+    status = models.CharField(max_length=100)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payment_count = models.PositiveIntegerField(default=0)
+    patient_count = models.PositiveIntegerField(default=0)  # Distinct patients who made these payments
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'method', 'status'], name='unique_daily_payment_rollup'),
+        ]
+
     def __str__(self):
-        return f"{self.examination.id} - {self.amount} via {self.get_method_display()}"
\ No newline at end of file
+        return f"{self.date} {self.method} {self.status}: {self.amount} ({self.payment_count})"
\ No newline at end of file
@@ -0,0 +1,85 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset, with cursors for its neighbours."""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(obj, fields):
+    values = [getattr(obj, field) for field in fields]
+    # isoformat keeps microseconds, so the cursor compares equal to the stored value
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(model, cursor, fields):
+    """Return the field values encoded in ``cursor``, or None if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, binascii.Error, ValidationError):
+        return None
+
+
+def _beyond(fields, values, lookup):
+    """Rows after ``values`` in (field1, field2, ...) order: f1 < v1 OR (f1 = v1 AND f2 < v2) ..."""
+    condition = Q()
+    for index, field in enumerate(fields):
+        term = Q(**{f'{field}__{lookup}': values[index]})
+        for previous, value in zip(fields[:index], values[:index]):
+            term &= Q(**{previous: value})
+        condition |= term
+    return condition
+
+
+def paginate_keyset(queryset, fields, after=None, before=None, page_size=25):
+    """
+    Return a page of ``queryset`` ordered by ``fields`` descending, starting
+    after the ``after`` cursor or ending before the ``before`` cursor.
+
+    Each page is one indexed range query, so its cost does not depend on how
+    many rows come before it. ``fields`` must end with a unique field.
+    """
+    model = queryset.model
+    descending = [f'-{field}' for field in fields]
+
+    values = decode_cursor(model, before, fields) if before else None
+    if values is not None:
+        # Walk backwards from the cursor, then restore newest-first order
+        rows = list(queryset.filter(_beyond(fields, values, 'gt')).order_by(*fields)[:page_size + 1])
+        has_more = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        return KeysetPage(
+            items,
+            next_cursor=encode_cursor(items[-1], fields) if items else None,
+            previous_cursor=encode_cursor(items[0], fields) if items and has_more else None,
+        )
+
+    values = decode_cursor(model, after, fields) if after else None
+    if values is not None:
+        queryset = queryset.filter(_beyond(fields, values, 'lt'))
+    rows = list(queryset.order_by(*descending)[:page_size + 1])
+    items = rows[:page_size]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1], fields) if len(rows) > page_size else None,
+        previous_cursor=encode_cursor(items[0], fields) if items and values is not None else None,
+    )
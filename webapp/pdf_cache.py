@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .converters import docx_to_pdf
+from .models import Examination
+
+_eviction_lock = threading.Lock()
+
+
+def _cache_dir():
+    return getattr(settings, 'PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'pdf_cache'))
+
+
+def pdf_cache_path(document_hash):
+    """Location of the cached PDF for a .docx with the given SHA-256."""
+    return os.path.join(_cache_dir(), document_hash[:2], f"{document_hash}.pdf")
+
+
+def get_cached_pdf(document_hash):
+    """Return the cached PDF path for the hash, or None if it has not been converted yet."""
+    path = pdf_cache_path(document_hash)
+    try:
+        # Mark as recently used for eviction through the access time only; the
+        # modification time stays the conversion time, which the ETag relies on
+        os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def cached_pdf_etag(document_hash, path):
+    """
+    A strong ETag for a cached PDF. Converting the same document again gives
+    different bytes, so besides the document's hash it names this particular
+    conversion by the file's modification time and size.
+    """
+    stat = os.stat(path)
+    return f"{document_hash}-pdf-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def get_or_convert_pdf(docx_path, document_hash=None):
+    """
+    Return a PDF of the .docx, converting it only if no PDF exists yet for the
+    document's current content.
+    """
+    if document_hash is None:
+        document_hash = Examination.calculate_document_hash(docx_path)
+
+    path = get_cached_pdf(document_hash)
+    if path is not None:
+        return path
+
+    path = pdf_cache_path(document_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Convert to a private file and rename it into place, so concurrent
+    # viewers never read a partially written PDF
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        docx_to_pdf(docx_path, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    evict_pdf_cache()
+    return path
+
+
+def evict_pdf_cache(max_bytes=None):
+    """Remove the least recently used PDFs until the cache fits within PDF_CACHE_MAX_BYTES."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'PDF_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+    with _eviction_lock:
+        entries = []
+        for root, _dirs, files in os.walk(_cache_dir()):
+            for name in files:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _used, size, _path in entries)
+        for _used, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
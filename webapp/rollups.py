@@ -0,0 +1,96 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyPaymentRollup, Examination, Payment
+
+
+def payment_bucket(date, method, status):
+    """The (local day, method, status) rollup row a payment with these values counts towards."""
+    return timezone.localdate(date), method, status
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def refresh_bucket(day, method, status):
+    """
+    Recompute one rollup row from that day's payments. The query is a range
+    on the (date, method, status) index, so it only reads one day's payments,
+    and recomputing rather than adding deltas keeps the row exact when a
+    payment moves between days, methods or statuses.
+    """
+    start, end = _day_range(day)
+    with transaction.atomic():
+        # Lock the row, so concurrent payments on the same day update it one at a time
+        rollup, _created = DailyPaymentRollup.objects.select_for_update().get_or_create(date=day, method=method, status=status)
+        totals = Payment.objects.filter(date__gte=start, date__lt=end, method=method, status=status).aggregate(
+            amount=Sum('amount'), payment_count=Count('id'), patient_count=Count('examination__patient', distinct=True),
+        )
+        if not totals['payment_count']:
+            rollup.delete()
+            return
+        rollup.amount = totals['amount']
+        rollup.payment_count = totals['payment_count']
+        rollup.patient_count = totals['patient_count']
+        rollup.save(update_fields=['amount', 'payment_count', 'patient_count'])
+
+
+def rebuild():
+    """Recompute every rollup row from all payments, e.g. after bulk updates that bypass signals."""
+    rows = (
+        Payment.objects.annotate(day=TruncDate('date'))
+        .values('day', 'method', 'status')
+        .annotate(amount=Sum('amount'), payment_count=Count('id'), patient_count=Count('examination__patient', distinct=True))
+        .order_by()
+    )
+    rollups = [
+        DailyPaymentRollup(
+            date=row['day'], method=row['method'], status=row['status'], amount=row['amount'],
+            payment_count=row['payment_count'], patient_count=row['patient_count'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        DailyPaymentRollup.objects.all().delete()
+        DailyPaymentRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def dashboard_totals(today=None):
+    """
+    Income and patients for today and this week (from Monday). Income is read
+    from at most a week of rollup rows. Patients are the distinct patients
+    examined, counted with one query on the date_created index, since the
+    rollups' per-row counts cannot be added up without counting a patient
+    once per day, method and status (and miss examinations not paid for).
+    """
+    today = today or timezone.localdate()
+    start_of_week = today - timedelta(days=today.weekday())
+    totals = {
+        'daily_income_cash': Decimal(0), 'daily_income_gcash': Decimal(0),
+        'weekly_income_cash': Decimal(0), 'weekly_income_gcash': Decimal(0),
+        'daily_pending': Decimal(0), 'weekly_pending': Decimal(0),
+    }
+    for rollup in DailyPaymentRollup.objects.filter(date__gte=start_of_week, date__lte=today):
+        periods = ['weekly', 'daily'] if rollup.date == today else ['weekly']
+        for period in periods:
+            if rollup.status == 'Paid':
+                totals[f'{period}_income_{rollup.method.lower()}'] += rollup.amount
+            else:
+                totals[f'{period}_pending'] += rollup.amount
+
+    start_of_today, end_of_today = _day_range(today)
+    totals.update(Examination.objects.filter(
+        date_created__gte=_day_range(start_of_week)[0], date_created__lt=end_of_today,
+    ).aggregate(
+        today_patients=Count('patient', distinct=True, filter=Q(date_created__gte=start_of_today)),
+        weekly_patients=Count('patient', distinct=True),
+    ))
+    return totals
@@ -0,0 +1,96 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Patient
+
+# FTS5 table of patient names; its rowid is the patient's id (see migration 0034)
+FTS_TABLE = 'webapp_patient_search'
+
+ID_QUERY_RE = re.compile(r'^(?:PID-?)?(\d+)$', re.IGNORECASE)
+TOKEN_RE = re.compile(r'\w+')
+
+
+def uses_fts():
+    """Full-text search is only available on SQLite; other databases use the ORM fallback."""
+    return connection.vendor == 'sqlite'
+
+
+def index_patient(patient):
+    """Add or refresh a patient's names in the search index."""
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [patient.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, first_name, middle_name, last_name) VALUES (%s, %s, %s, %s)",
+            [patient.pk, patient.first_name, patient.middle_name or '', patient.last_name],
+        )
+
+
+def remove_patient(patient_id):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [patient_id])
+
+
+def rebuild_index():
+    """Re-index every patient, e.g. after bulk updates that bypass signals."""
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, first_name, middle_name, last_name) "
+            f"SELECT id, first_name, COALESCE(middle_name, ''), last_name FROM {Patient._meta.db_table}"
+        )
+
+
+def parse_query(query):
+    """Split a search into patient IDs ('PID-012', '12') and lowercase name tokens."""
+    ids = []
+    tokens = []
+    for part in query.split():
+        match = ID_QUERY_RE.match(part)
+        if match:
+            ids.append(int(match.group(1)))
+        else:
+            tokens.extend(TOKEN_RE.findall(part.lower()))
+    return ids, tokens
+
+
+def search_patients(query, limit=10):
+    """
+    Return up to ``limit`` patients matching every term of ``query``, best
+    match first. Name terms match the start of any word of the first,
+    middle or last name; ID terms match the patient ID exactly.
+    """
+    ids, tokens = parse_query(query)
+    if not ids and not tokens:
+        return []
+    if not tokens:
+        return list(Patient.objects.filter(id__in=ids).order_by('id')[:limit])
+
+    if not uses_fts():
+        filters = Q(id__in=ids) if ids else Q()
+        for token in tokens:
+            filters &= Q(first_name__istartswith=token) | Q(middle_name__istartswith=token) | Q(last_name__istartswith=token)
+        return list(Patient.objects.filter(filters).order_by('last_name', 'first_name', 'id')[:limit])
+
+    # Every token is a prefix query; FTS5 ANDs them and ranks by BM25
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    params = [match]
+    if ids:
+        sql += f" AND rowid IN ({', '.join(['%s'] * len(ids))})"
+        params.extend(ids)
+    sql += " ORDER BY rank LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ranked_ids = [row[0] for row in cursor.fetchall()]
+
+    patients = Patient.objects.in_bulk(ranked_ids)
+    return [patients[patient_id] for patient_id in ranked_ids if patient_id in patients]
@@ -0,0 +1,104 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import rollups, search
+from .duplicates import assign_blocking_keys
+from .images import ensure_print_derivative
+from .models import Patient, PatientIdWidth, Examination, CustomUser, Payment
+from .typeahead import patient_typeahead
+from .verification import issued_codes, verified_documents
+
+
+def _make_print_derivative(image_field):
+    """Prepare the document-sized copy of an uploaded image; failures fall back to the original later."""
+    if image_field:
+        try:
+            ensure_print_derivative(image_field)
+        except (OSError, ValueError):
+            pass
+
+
+@receiver(pre_save, sender=Patient)
+def patient_saving(sender, instance, **kwargs):
+    # Only re-estimate the birth year for a new patient or a changed age, so later edits do not move it
+    previous_age = None
+    if instance.pk:
+        previous_age = Patient.objects.filter(pk=instance.pk).values_list('age', flat=True).first()
+    assign_blocking_keys(instance, update_birth_year=previous_age != instance.age)
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, created, **kwargs):
+    _make_print_derivative(instance.image)
+    search.index_patient(instance)
+    patient_typeahead.add(instance)
+    if not created:
+        return
+    # The patient count grew, so the formatted ID width may have to grow with it
+    PatientIdWidth.grow(Patient.required_id_width())
+    if not instance.secure_hashed_id:
+        instance.secure_hashed_id = instance.build_secure_hashed_id()
+        Patient.objects.filter(pk=instance.pk).update(secure_hashed_id=instance.secure_hashed_id)
+
+
+@receiver(post_delete, sender=Patient)
+def patient_deleted(sender, instance, **kwargs):
+    search.remove_patient(instance.pk)
+    patient_typeahead.discard(instance.pk)
+
+
+@receiver(pre_save, sender=Examination)
+def examination_saving(sender, instance, update_fields=None, **kwargs):
+    # Remember the patient, so moving an examination can fix its payments' patient counts
+    instance._previous_patient_id = None
+    if instance.pk and (update_fields is None or 'patient' in update_fields):
+        instance._previous_patient_id = Examination.objects.filter(pk=instance.pk).values_list('patient_id', flat=True).first()
+
+
+@receiver(post_save, sender=Examination)
+def examination_saved(sender, instance, **kwargs):
+    previous_patient_id = getattr(instance, '_previous_patient_id', None)
+    if previous_patient_id is not None and previous_patient_id != instance.patient_id:
+        buckets = {rollups.payment_bucket(*payment) for payment in instance.payment_set.values_list('date', 'method', 'status')}
+        for bucket in buckets:
+            rollups.refresh_bucket(*bucket)
+    if instance.unique_code:
+        issued_codes.add(instance.unique_code)
+        # The edited document may have changed, so drop any cached verification
+        verified_documents.discard(instance.unique_code)
+
+
+@receiver(post_delete, sender=Examination)
+def examination_deleted(sender, instance, **kwargs):
+    if instance.unique_code:
+        issued_codes.discard(instance.unique_code)
+        verified_documents.discard(instance.unique_code)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, **kwargs):
+    _make_print_derivative(instance.signature_image)
+
+
+@receiver(pre_save, sender=Payment)
+def payment_saving(sender, instance, **kwargs):
+    # Remember the old day, method and status, so a changed payment leaves its old rollup row too
+    instance._previous_bucket = None
+    if instance.pk:
+        previous = Payment.objects.filter(pk=instance.pk).values_list('date', 'method', 'status').first()
+        if previous:
+            instance._previous_bucket = rollups.payment_bucket(*previous)
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, **kwargs):
+    bucket = rollups.payment_bucket(instance.date, instance.method, instance.status)
+    rollups.refresh_bucket(*bucket)
+    previous_bucket = getattr(instance, '_previous_bucket', None)
+    if previous_bucket and previous_bucket != bucket:
+        rollups.refresh_bucket(*previous_bucket)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    rollups.refresh_bucket(*rollups.payment_bucket(instance.date, instance.method, instance.status))
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_DIR = '.blobs'
+# Retries when a name is taken or a concurrent delete removes the blob mid-save
+PUBLISH_ATTEMPTS = 100
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(65536):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that keeps one copy of each distinct file.
+
+    Every upload is written to a temporary file while its SHA-256 is computed,
+    then published atomically as ``.blobs/<aa>/<sha256>``. The file at the
+    requested name is a hard link to that blob, so identical uploads share one
+    copy on disk, existing paths and MEDIA_URL keep working, and the link
+    count is the blob's reference count.
+    """
+
+    def blob_path(self, digest):
+        return os.path.join(self.location, BLOB_DIR, digest[:2], digest)
+
+    def _publish(self, temp_path, digest):
+        """Store the temporary file as the blob for ``digest``, or reuse the blob already there."""
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(temp_path, blob)
+        except FileExistsError:
+            pass  # Another upload already stored the same bytes
+        return blob
+
+    def _save(self, name, content):
+        temp_dir = os.path.join(self.location, BLOB_DIR, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        hasher = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+
+            digest = hasher.hexdigest()
+            for _attempt in range(PUBLISH_ATTEMPTS):
+                blob = self._publish(temp_path, digest)
+                full_path = self.path(name)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                try:
+                    # Linking fails instead of overwriting, so concurrent
+                    # workers can never clobber each other's files
+                    os.link(blob, full_path)
+                    break
+                except FileExistsError:
+                    name = self.get_available_name(name)
+                except FileNotFoundError:
+                    # A concurrent delete() removed the last other link and the blob
+                    # after we found it; publish our copy as the blob again
+                    continue
+            else:
+                raise OSError(f"Could not store {name} after {PUBLISH_ATTEMPTS} attempts.")
+        finally:
+            os.remove(temp_path)
+        return str(name).replace('\\', '/')
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        path = self.path(name)
+        try:
+            links = os.stat(path).st_nlink
+        except FileNotFoundError:
+            return
+        if links == 2:
+            # This is the last reference besides the blob itself
+            blob = self.blob_path(file_sha256(path))
+            if os.path.exists(blob) and os.path.samefile(blob, path):
+                os.remove(blob)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
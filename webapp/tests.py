@@ -1,3 +1,636 @@
-from django.test import TestCase
+import csv
+import hashlib
+import os
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import datetime
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import rollups
+from .converters import ConversionError, LibreOfficeConverter, WordConverter
+from .duplicates import find_duplicate_patients
+from .file_responses import serve_file
+from .images import ensure_print_derivative
+from .models import BackgroundJob, CustomUser, DailyPaymentRollup, Examination, Patient, PatientIdWidth, Payment, ServiceType
+from .pdf_cache import cached_pdf_etag, get_cached_pdf, pdf_cache_path
+from .storage import ContentAddressedStorage, file_sha256
+from .verification import IssuedCodeFilter
+
+
+class ExaminationListQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = CustomUser.objects.create_user(email='employee@example.com', password='password', is_employee=True)
+        cls.doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+        cls.service_types = [ServiceType.objects.create(name='X-Ray'), ServiceType.objects.create(name='Ultrasound')]
+
+    def setUp(self):
+        self.client.force_login(self.employee)
+
+    def add_examinations(self, count):
+        for index in range(count):
+            patient = Patient.objects.create(
+                first_name=f'Patient{index}', last_name='Example', age=30, sex='Female',
+                address='Address', contact_number='09170000000',
+            )
+            examination = Examination.objects.create(patient=patient, attending_doctor=self.doctor)
+            examination.service_types.set(self.service_types)
+            Payment.objects.create(examination=examination, amount=500, method='Gcash', status='Paid')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('employee_examination'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_examinations(1)
+        self.count_queries()  # Warm caches such as the patient ID width
+        one_row = self.count_queries()
+
+        self.add_examinations(5)
+        self.count_queries()
+        six_rows = self.count_queries()
+
+        self.assertEqual(one_row, six_rows)
+
+    def test_rows_show_the_first_payment(self):
+        self.add_examinations(1)
+        examination = Examination.objects.get()
+        Payment.objects.create(examination=examination, amount=100, method='Cash', status='Pending')
+
+        response = self.client.get(reverse('employee_examination'))
+        self.assertEqual(response.context['examinations'].items[0].primary_payment.method, 'Gcash')
+        self.assertContains(response, '<td>Gcash</td>')
+
+
+class ExaminationExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = CustomUser.objects.create_user(email='employee@example.com', password='password', is_employee=True)
+        cls.doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+        patient = Patient.objects.create(
+            first_name='Ana', middle_name='Reyes', last_name='Cruz', age=30, sex='Female',
+            address='Address', contact_number='09170000000',
+        )
+        cls.paid = Examination.objects.create(patient=patient, attending_doctor=cls.doctor)
+        cls.paid.service_types.set([ServiceType.objects.create(name='X-Ray'), ServiceType.objects.create(name='Ultrasound')])
+        Payment.objects.create(examination=cls.paid, amount=500, method='Cash', status='Paid')
+        Payment.objects.create(examination=cls.paid, amount=250, method='Gcash', status='Pending')
+        cls.unpaid = Examination.objects.create(patient=patient, attending_doctor=cls.doctor)
+
+    def setUp(self):
+        self.client.force_login(self.employee)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_examinations'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_unfiltered_csv_has_one_row_per_payment(self):
+        response = self.export()
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="examinations_all.csv"')
+        header, *rows = csv.reader(StringIO(b''.join(response.streaming_content).decode()))
+        self.assertEqual(header[0], 'File No.')
+        self.assertEqual(
+            [(row[0], row[3], row[8], row[9], row[10], row[11]) for row in rows],
+            [
+                (self.paid.file_number, 'Cruz, Ana R.', 'Ultrasound, X-Ray', 'Cash', '500.00', 'Paid'),
+                (self.paid.file_number, 'Cruz, Ana R.', 'Ultrasound, X-Ray', 'Gcash', '250.00', 'Pending'),
+                (self.unpaid.file_number, 'Cruz, Ana R.', '', '', '', ''),
+            ],
+        )
+
+    def test_filters_apply_to_the_export(self):
+        response = self.export(payment_status='none')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))[1:]
+        self.assertEqual([row[0] for row in rows], [self.unpaid.file_number])
+
+    def test_xlsx_is_a_workbook_with_every_row(self):
+        response = self.export(format='xlsx')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row '), 4)
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(reverse('export_examinations'), {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DailyPaymentRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+
+    def add_examination(self, first_name='Juan'):
+        patient = Patient.objects.create(
+            first_name=first_name, last_name='Dela Cruz', age=30, sex='Male', address='Address', contact_number='09170000000',
+        )
+        return Examination.objects.create(patient=patient, attending_doctor=self.doctor)
+
+    def rollup(self, method, status):
+        return DailyPaymentRollup.objects.get(date=timezone.localdate(), method=method, status=status)
+
+    def test_payments_update_the_days_totals(self):
+        examination = self.add_examination()
+        Payment.objects.create(examination=examination, amount=500, method='Cash', status='Paid')
+        Payment.objects.create(examination=examination, amount=250, method='Cash', status='Paid')
+        Payment.objects.create(examination=self.add_examination('Maria'), amount=100, method='Cash', status='Paid')
+
+        rollup = self.rollup('Cash', 'Paid')
+        self.assertEqual((rollup.amount, rollup.payment_count, rollup.patient_count), (Decimal('850'), 3, 2))
+        self.assertEqual(rollups.dashboard_totals()['daily_income_cash'], Decimal('850'))
+
+    def test_changed_and_deleted_payments_leave_their_old_rows(self):
+        payment = Payment.objects.create(examination=self.add_examination(), amount=500, method='Cash', status='Pending')
+        payment.status = 'Paid'
+        payment.save()
+        self.assertFalse(DailyPaymentRollup.objects.filter(status='Pending').exists())
+        self.assertEqual(self.rollup('Cash', 'Paid').amount, Decimal('500'))
+
+        payment.delete()
+        self.assertFalse(DailyPaymentRollup.objects.exists())
+
+    def test_rebuild_matches_signal_maintained_rows(self):
+        examination = self.add_examination()
+        Payment.objects.create(examination=examination, amount=500, method='Cash', status='Paid')
+        Payment.objects.create(examination=examination, amount=300, method='Gcash', status='Pending')
+        maintained = list(DailyPaymentRollup.objects.order_by('method').values('date', 'method', 'status', 'amount', 'payment_count', 'patient_count'))
+
+        rollups.rebuild()
+        rebuilt = list(DailyPaymentRollup.objects.order_by('method').values('date', 'method', 'status', 'amount', 'payment_count', 'patient_count'))
+        self.assertEqual(maintained, rebuilt)
+
+    def test_dashboard_counts_each_patient_examined_once(self):
+        wednesday, tuesday = (timezone.make_aware(datetime(2026, 10, day, 10)) for day in (14, 13))
+        paying = self.add_examination()
+        Payment.objects.create(examination=paying, amount=500, method='Cash', status='Paid')
+        Payment.objects.create(examination=paying, amount=300, method='Gcash', status='Pending')
+        again = Examination.objects.create(patient=paying.patient, attending_doctor=self.doctor)
+        unpaid = self.add_examination('Maria')
+        earlier = self.add_examination('Jose')
+        Examination.objects.filter(pk__in=[paying.pk, again.pk, unpaid.pk]).update(date_created=wednesday)
+        Examination.objects.filter(pk=earlier.pk).update(date_created=tuesday)
+        Examination.objects.create(patient=paying.patient, attending_doctor=self.doctor)  # Later than that Wednesday
+
+        totals = rollups.dashboard_totals(today=wednesday.date())
+        self.assertEqual((totals['today_patients'], totals['weekly_patients']), (2, 3))
+
+    def test_str(self):
+        payment = Payment.objects.create(examination=self.add_examination(), amount=500, method='Gcash', status='Paid')
+        self.assertEqual(str(payment), f"{payment.examination_id} - 500 via GCash")
+        self.assertEqual(str(self.rollup('Gcash', 'Paid')), f"{timezone.localdate()} Gcash Paid: 500.00 (1)")
+
+
+class DuplicatePatientTests(TestCase):
+    def add_patient(self, **fields):
+        values = dict(first_name='Juan', last_name='Reyes', age=30, sex='Male', address='Address', contact_number='0917 123 4567')
+        values.update(fields)
+        return Patient.objects.create(**values)
+
+    def test_new_patient_gets_blocking_keys(self):
+        patient = self.add_patient()
+        self.assertEqual(patient.name_key, 'R200J500')
+        self.assertEqual(patient.contact_key, '9171234567')
+        self.assertEqual(patient.birth_year, timezone.localdate().year - 30)
+
+    def test_birth_year_is_kept_when_other_fields_change(self):
+        patient = self.add_patient()
+        # As if registered years ago: the stored estimate must not follow today's date
+        Patient.objects.filter(pk=patient.pk).update(birth_year=1990)
+        patient.refresh_from_db()
+
+        patient.contact_number = '+63 918 000 0000'
+        patient.save()
+        patient.refresh_from_db()
+        self.assertEqual(patient.birth_year, 1990)
+        self.assertEqual(patient.contact_key, '9180000000')
+
+        patient.age = 31
+        patient.save()
+        patient.refresh_from_db()
+        self.assertEqual(patient.birth_year, timezone.localdate().year - 31)
+
+    def test_finding_duplicates_keeps_a_saved_patients_keys(self):
+        patient = self.add_patient()
+        self.add_patient(first_name='Jaun')
+        Patient.objects.filter(pk=patient.pk).update(birth_year=timezone.localdate().year - 31)
+        patient.refresh_from_db()
+
+        self.assertEqual(len(find_duplicate_patients(patient)), 1)
+        self.assertEqual(patient.birth_year, timezone.localdate().year - 31)
+
+    def test_new_patient_is_matched_against_similar_ones(self):
+        existing = self.add_patient()
+        self.add_patient(first_name='Maria', last_name='Santos', contact_number='09990000000', sex='Female')
+
+        candidate = Patient(first_name='Juan', last_name='Reyes', age=30, sex='Male', address='Address', contact_number='09171234567')
+        self.assertEqual([patient for patient, _score in find_duplicate_patients(candidate)], [existing])
+
+
+class PatientIdWidthTests(TestCase):
+    def add_patient(self):
+        return Patient.objects.create(
+            first_name='Ana', last_name='Cruz', age=30, sex='Female', address='Address', contact_number='09170000000',
+        )
+
+    def test_width_is_stored_for_every_worker(self):
+        self.add_patient()
+        self.assertEqual(Patient.get_id_width(refresh=True), 2)
+        # Another worker registers patients and widens the IDs
+        PatientIdWidth.objects.filter(pk=1).update(digits=5)
+        patient = self.add_patient()
+        self.assertEqual(patient.secure_hashed_id, hashlib.sha256(f"Patient2025PID-{patient.id:05d}Identity2024".encode()).hexdigest())
+        self.assertEqual(patient.get_formatted_id(), f"PID-{patient.id:05d}")
+
+    def test_width_grows_with_the_patient_count_but_never_shrinks(self):
+        patients = [self.add_patient() for _ in range(10)]
+        self.assertEqual(PatientIdWidth.objects.get().digits, 3)
+        Patient.objects.filter(pk__in=[patient.pk for patient in patients[1:]]).delete()
+        self.assertEqual(Patient.get_id_width(refresh=True), 3)
+
+
+class UniqueCodeTests(TestCase):
+    def setUp(self):
+        doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+        patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', age=30, sex='Female', address='Address', contact_number='09170000000',
+        )
+        self.first, self.second = (Examination.objects.create(patient=patient, attending_doctor=doctor) for _ in range(2))
+
+    def test_colliding_code_is_replaced(self):
+        colliding = f"CHMC-{self.second.build_raw_unique_code(self.second.file_number)[:8].upper()}"
+        Examination.objects.filter(pk=self.first.pk).update(unique_code=colliding)
+
+        with transaction.atomic():  # As in add_examination, which must not be rolled back
+            self.second.assign_unique_codes()
+            self.second.refresh_from_db()
+
+        self.assertNotEqual(self.second.unique_code, colliding)
+        self.assertEqual(self.second.raw_unique_code, self.second.build_raw_unique_code(self.second.file_number, 1))
+        self.assertEqual(self.second.unique_code, f"CHMC-{self.second.raw_unique_code[:8].upper()}")
+
+
+class BatchVerificationTests(TestCase):
+    def setUp(self):
+        doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+        patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', age=30, sex='Female', address='Address', contact_number='09170000000',
+        )
+        self.examination = Examination.objects.create(
+            patient=patient, attending_doctor=doctor, edited_document='examination_documents/edited/result.docx',
+        )
+        self.examination.assign_unique_codes()
+
+    def verify(self, codes, render=False):
+        response = self.client.post(
+            reverse('verify_documents_batch'), {'codes': codes, 'render': render}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_every_code_gets_a_result_in_order(self):
+        code = self.examination.unique_code
+        results = self.verify([code, 'nonsense', code.lower(), 'CHMC-00000000'])
+        self.assertEqual(
+            [(result['code'], result['status']) for result in results],
+            [(code, 'found'), ('nonsense', 'invalid'), (code.lower(), 'found'), ('CHMC-00000000', 'not_found')],
+        )
+
+    @mock.patch('webapp.pdf_cache.docx_to_pdf')
+    def test_render_queues_conversions_instead_of_converting(self, docx_to_pdf):
+        code = self.examination.unique_code
+        results = self.verify([code, code], render=True)
+        self.assertEqual([result['pdf_queued'] for result in results], [True, True])
+        self.verify([code], render=True)
+
+        docx_to_pdf.assert_not_called()
+        self.assertEqual(BackgroundJob.objects.filter(task='convert_pdf', examination=self.examination).count(), 1)
+
+
+class VerifyDocumentTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.docx_path = os.path.join(media.name, 'result.docx')
+        with open(self.docx_path, 'wb') as f:
+            f.write(b'edited document')
+        self.pdf_path = os.path.join(media.name, 'result.pdf')
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4')
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+        patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', age=30, sex='Female', address='Address', contact_number='09170000000',
+        )
+        self.examination = Examination.objects.create(
+            patient=patient, attending_doctor=doctor, edited_document='result.docx',
+            original_document_hash=file_sha256(self.docx_path), edited_document_size=os.path.getsize(self.docx_path),
+            edited_document_hashed_at=timezone.now(),
+        )
+        self.examination.assign_unique_codes()
+
+    @mock.patch('webapp.models.Examination.calculate_document_hash')
+    def test_verified_document_is_converted_by_its_stored_hash(self, calculate_document_hash):
+        with mock.patch('webapp.views.get_or_convert_pdf', return_value=self.pdf_path) as get_or_convert_pdf:
+            for _ in range(2):  # The second request is answered from verified_documents
+                response = self.client.post(reverse('verify_document'), {'unique_code': self.examination.unique_code})
+                self.assertEqual(response['Content-Type'], 'application/pdf')
+                response.close()
+
+        self.assertEqual(
+            get_or_convert_pdf.call_args_list,
+            [mock.call(self.docx_path, self.examination.original_document_hash)] * 2,
+        )
+        calculate_document_hash.assert_not_called()
+
+
+class IssuedCodeFilterTests(TestCase):
+    def setUp(self):
+        doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+        patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', age=30, sex='Female', address='Address', contact_number='09170000000',
+        )
+        self.examination = Examination.objects.create(patient=patient, attending_doctor=doctor)
+        self.filter = IssuedCodeFilter()
+
+    def test_code_assigned_to_an_existing_row_is_picked_up_by_the_refresh(self):
+        self.assertFalse(self.filter.might_contain('CHMC-0000ABCD'))
+        # As another worker or backfill_unique_codes would, without this process's signals
+        Examination.objects.filter(pk=self.examination.pk).update(
+            unique_code='CHMC-0000ABCD', unique_code_assigned_at=timezone.now(),
+        )
+        self.filter.refresh_interval = 0
+        self.assertTrue(self.filter.might_contain('CHMC-0000ABCD'))
+
+    def test_misses_between_refreshes_need_no_query(self):
+        self.filter.might_contain('CHMC-0000ABCD')
+        with self.assertNumQueries(0):
+            self.assertFalse(self.filter.might_contain('CHMC-FFFFFFFF'))
+
+    def test_code_never_issued_is_rejected(self):
+        self.examination.assign_unique_codes()
+        self.assertTrue(self.filter.might_contain(self.examination.unique_code))
+        self.assertFalse(self.filter.might_contain('CHMC-FFFFFFFF'))
+
+
+class InlineExecutor:
+    """Stands in for ProcessPoolExecutor, running each chunk in the test's own process."""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@mock.patch('webapp.management.commands.regenerate_documents.ProcessPoolExecutor', InlineExecutor)
+class RegenerateDocumentsCommandTests(TestCase):
+    def setUp(self):
+        doctor = CustomUser.objects.create_user(email='doctor@example.com', password='password', is_clinic_doctor=True)
+        patient = Patient.objects.create(
+            first_name='Ana', last_name='Cruz', age=30, sex='Female', address='Address', contact_number='09170000000',
+        )
+        self.ids = [Examination.objects.create(patient=patient, attending_doctor=doctor).id for _ in range(3)]
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.state_file = os.path.join(state_dir.name, 'regenerate.state')
+
+    def run_command(self, regenerate, **options):
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('webapp.management.commands.regenerate_documents._regenerate_chunk', side_effect=regenerate):
+            call_command('regenerate_documents', chunk_size=1, state_file=self.state_file, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_chunk_that_raises_is_recorded_as_a_failure(self):
+        def regenerate(chunk):
+            if chunk == [self.ids[0]]:
+                raise RuntimeError("worker died")
+            return chunk, []
+
+        stdout, stderr = self.run_command(regenerate)
+        self.assertIn(f"Examination {self.ids[0]}: worker died", stderr)
+        self.assertIn("Regenerated 2 document(s)", stdout)
+
+        # The failed examination is all that is left for the next run
+        stdout, stderr = self.run_command(lambda chunk: (chunk, []))
+        self.assertIn("Regenerated 1 document(s)", stdout)
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_refuses_to_resume_another_selection(self):
+        self.run_command(lambda chunk: ([], [(pk, "failed") for pk in chunk]), ids=self.ids[:1])
+        with self.assertRaisesMessage(CommandError, "different selection"):
+            self.run_command(lambda chunk: (chunk, []), ids=self.ids[1:])
+        stdout, stderr = self.run_command(lambda chunk: (chunk, []), ids=self.ids[1:], restart=True)
+        self.assertIn("Regenerated 2 document(s)", stdout)
+
+    def test_date_bounds_include_the_whole_local_day(self):
+        today = timezone.localdate().isoformat()
+        stdout, stderr = self.run_command(lambda chunk: (chunk, []), date_from=today, date_to=today)
+        self.assertIn("Regenerated 3 document(s)", stdout)
+        stdout, stderr = self.run_command(lambda chunk: (chunk, []), date_to='2000-01-01')
+        self.assertIn("Nothing to regenerate.", stdout)
+
+
+class WordConverterTests(SimpleTestCase):
+    def setUp(self):
+        self.word = mock.MagicMock()
+        self.dispatch = mock.Mock(return_value=self.word)
+        modules = {'pythoncom': mock.Mock(), 'win32com': mock.Mock(), 'win32com.client': mock.Mock(DispatchEx=self.dispatch)}
+        patcher = mock.patch.dict('sys.modules', modules)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.converter = WordConverter(timeout=5)
+        self.addCleanup(self.converter.shutdown)
+
+    def test_one_word_instance_serves_every_conversion(self):
+        self.converter.convert('first.docx', 'first.pdf')
+        self.converter.convert('second.docx', 'second.pdf')
+        self.assertEqual(self.dispatch.call_count, 1)
+        self.word.Quit.assert_not_called()
+        self.assertEqual(self.converter.health_check()['ok'], True)
+
+    def test_failed_conversion_replaces_the_instance(self):
+        self.word.Documents.Open.side_effect = [Exception("Word stopped responding"), mock.MagicMock()]
+        with self.assertRaisesMessage(ConversionError, "Word stopped responding"):
+            self.converter.convert('first.docx', 'first.pdf')
+        self.converter.convert('second.docx', 'second.pdf')
+        self.assertEqual(self.dispatch.call_count, 2)
+
+
+class LibreOfficeConverterTests(SimpleTestCase):
+    @override_settings(UNOSERVER_BINARY='/nonexistent/unoserver')
+    def test_health_check_reports_a_listener_that_cannot_start(self):
+        converter = LibreOfficeConverter(pool_size=2, startup_timeout=1)
+        self.addCleanup(converter.shutdown)
+        status = converter.health_check()
+        self.assertEqual((status['ok'], status['running']), (False, []))
+        self.assertIn("Could not start LibreOffice listener", status['error'])
+
+
+class PrintDerivativeTests(SimpleTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.source = mock.Mock(path=os.path.join(media.name, 'signature.png'), name='signature.png')
+
+    def save_source(self, color, mtime):
+        Image.new('RGB', (40, 40), color).save(self.source.path)
+        os.utime(self.source.path, (mtime, mtime))
+
+    def test_reused_name_with_an_older_mtime_gets_its_own_derivative(self):
+        self.save_source('red', 2_000_000_000)
+        red = ensure_print_derivative(self.source)
+        # A new upload under the same name, linked to an older blob with an older mtime
+        self.save_source('blue', 1_000_000_000)
+        blue = ensure_print_derivative(self.source)
+
+        self.assertNotEqual(red, blue)
+        with Image.open(blue) as image:
+            red_channel, _green, blue_channel = image.convert('RGB').getpixel((0, 0))
+        self.assertLess(red_channel, 20)
+        self.assertGreater(blue_channel, 235)
+        self.assertEqual(ensure_print_derivative(self.source), blue)
+
+
+class ServeFileTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'document.pdf')
+        with open(self.path, 'wb') as f:
+            f.write(b'0123456789')
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        return serve_file(self.factory.get('/', **headers), self.path, content_type='application/pdf', etag='abc')
+
+    def test_full_response_has_validators(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['ETag'], '"abc"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_matching_etag_is_not_modified(self):
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"abc"').status_code, 304)
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_byte_ranges(self):
+        response = self.serve(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self.serve(HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.serve(HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_for_another_version_gets_the_whole_file(self):
+        self.assertEqual(self.serve(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"abc"').status_code, 206)
+        response = self.serve(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+
+class CachedPdfEtagTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(PDF_CACHE_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.document_hash = 'ab' * 32
+
+    def convert(self, content):
+        path = pdf_cache_path(self.document_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(content)
+        os.replace(f"{path}.tmp", path)
+        return path
+
+    def test_cache_hits_keep_the_etag(self):
+        path = self.convert(b'%PDF-1 first')
+        etag = cached_pdf_etag(self.document_hash, path)
+        self.assertEqual(get_cached_pdf(self.document_hash), path)
+        self.assertEqual(cached_pdf_etag(self.document_hash, path), etag)
+
+    def test_reconverted_pdf_gets_a_new_etag(self):
+        path = self.convert(b'%PDF-1 first')
+        etag = cached_pdf_etag(self.document_hash, path)
+        os.remove(path)  # Evicted
+        self.convert(b'%PDF-1 second conversion')
+        self.assertNotEqual(cached_pdf_etag(self.document_hash, path), etag)
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.storage.save('a.txt', ContentFile(b'same bytes'))
+        second = self.storage.save('b.txt', ContentFile(b'same bytes'))
+        self.assertTrue(os.path.samefile(self.storage.path(first), self.storage.path(second)))
+
+        self.storage.delete(first)
+        blob = self.storage.blob_path(file_sha256(self.storage.path(second)))
+        self.assertTrue(os.path.exists(blob))
+        self.storage.delete(second)
+        self.assertFalse(os.path.exists(blob))
+
+    def test_save_survives_the_blob_being_deleted_concurrently(self):
+        first = self.storage.save('a.txt', ContentFile(b'same bytes'))
+        blob = self.storage.blob_path(hashlib.sha256(b'same bytes').hexdigest())
+        real_link = os.link
+        deleted = []
+
+        def link(source, destination):
+            # Another worker deletes the only other file just before we link to the existing blob
+            if source == blob and not deleted:
+                deleted.append(first)
+                self.storage.delete(first)
+            return real_link(source, destination)
+
+        with mock.patch('webapp.storage.os.link', side_effect=link):
+            second = self.storage.save('b.txt', ContentFile(b'same bytes'))
+
+        self.assertEqual(deleted, [first])
+        with self.storage.open(second) as f:
+            self.assertEqual(f.read(), b'same bytes')
+        self.assertTrue(os.path.samefile(self.storage.path(second), blob))
@@ -0,0 +1,154 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+WORD_RE = re.compile(r'\w+')
+ID_PREFIX_RE = re.compile(r'^(?:PID-?)?(\d+)$', re.IGNORECASE)
+
+
+def normalize(text):
+    """Lowercase text without accents, so 'Peña' is found by typing 'pena'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+class PatientPrefixIndex:
+    """
+    Sorted (word, patient id) pairs of every patient's normalized names, plus
+    their IDs, held in memory so typeahead suggestions never hit the database.
+
+    A lookup finds each typed prefix's range by binary search and walks only
+    the narrowest range, checking the other prefixes against that patient's
+    words, so it costs O(log n) plus the number of suggestions returned.
+
+    The index is built lazily on first use and updated by signals when this
+    process saves or deletes a patient. Patients added by other worker
+    processes are picked up by an incremental refresh (at most once per
+    refresh interval), and edits by a periodic full rebuild.
+    """
+
+    def __init__(self, refresh_interval=5, rebuild_interval=600):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._words = []  # Sorted (word, patient id)
+        self._ids = []  # Sorted (str(patient id), patient id)
+        self._patients = {}  # Patient id -> (words, label)
+        self._last_id = 0
+        self._built_at = None
+        self._refreshed_at = 0
+
+    def _queryset(self):
+        from .models import Patient
+        return Patient.objects.order_by('id').values_list('id', 'first_name', 'middle_name', 'last_name')
+
+    @staticmethod
+    def _entry(first_name, middle_name, last_name):
+        label = ' '.join(name for name in (first_name, middle_name, last_name) if name)
+        return tuple(sorted(set(WORD_RE.findall(normalize(label))))), label
+
+    def rebuild(self):
+        patients = {}
+        last_id = 0
+        for patient_id, *names in self._queryset().iterator(chunk_size=2000):
+            patients[patient_id] = self._entry(*names)
+            last_id = patient_id
+        words = sorted((word, patient_id) for patient_id, (entry_words, _label) in patients.items() for word in entry_words)
+        ids = sorted((str(patient_id), patient_id) for patient_id in patients)
+        with self._lock:
+            self._patients, self._words, self._ids = patients, words, ids
+            self._last_id = last_id
+            self._built_at = self._refreshed_at = time.monotonic()
+
+    def _refresh(self):
+        """Add patients stored since the last build or refresh."""
+        new_rows = list(self._queryset().filter(id__gt=self._last_id))
+        with self._lock:
+            for patient_id, *names in new_rows:
+                self._insert(patient_id, *names)
+            self._refreshed_at = time.monotonic()
+
+    def _insert(self, patient_id, first_name, middle_name, last_name):
+        self._remove(patient_id)
+        words, label = self._entry(first_name, middle_name, last_name)
+        self._patients[patient_id] = (words, label)
+        for word in words:
+            insort(self._words, (word, patient_id))
+        insort(self._ids, (str(patient_id), patient_id))
+        self._last_id = max(self._last_id, patient_id)
+
+    def _remove(self, patient_id):
+        entry = self._patients.pop(patient_id, None)
+        if entry is None:
+            return
+        for word in entry[0]:
+            index = bisect_left(self._words, (word, patient_id))
+            if index < len(self._words) and self._words[index] == (word, patient_id):
+                del self._words[index]
+        index = bisect_left(self._ids, (str(patient_id), patient_id))
+        if index < len(self._ids) and self._ids[index][1] == patient_id:
+            del self._ids[index]
+
+    def add(self, patient):
+        if self._built_at is None:
+            return  # Picked up by the first build
+        with self._lock:
+            self._insert(patient.pk, patient.first_name, patient.middle_name, patient.last_name)
+
+    def discard(self, patient_id):
+        with self._lock:
+            self._remove(patient_id)
+
+    @staticmethod
+    def _range(pairs, prefix):
+        return bisect_left(pairs, (prefix,)), bisect_left(pairs, (prefix + '\uffff',))
+
+    def suggest(self, query, limit=10):
+        """Return up to ``limit`` (patient id, label) pairs matching every typed prefix."""
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at > self.rebuild_interval:
+            self.rebuild()
+        elif now - self._refreshed_at > self.refresh_interval:
+            self._refresh()
+
+        name_prefixes = []
+        id_prefixes = []
+        for part in query.split():
+            match = ID_PREFIX_RE.match(part)
+            if match:
+                id_prefixes.append(match.group(1).lstrip('0'))  # 'PID-007' is patient 7
+            else:
+                name_prefixes.extend(WORD_RE.findall(normalize(part)))
+        if not name_prefixes and not id_prefixes:
+            return []
+
+        with self._lock:
+            # Walk the narrowest prefix range and check the rest per patient
+            ranges = [(self._words, prefix, self._range(self._words, prefix)) for prefix in name_prefixes]
+            ranges += [(self._ids, prefix, self._range(self._ids, prefix)) for prefix in id_prefixes]
+            pairs, _prefix, (start, end) = min(ranges, key=lambda item: item[2][1] - item[2][0])
+
+            results = []
+            seen = set()
+            for index in range(start, end):
+                patient_id = pairs[index][1]
+                if patient_id in seen:
+                    continue
+                seen.add(patient_id)
+                words, label = self._patients[patient_id]
+                if all(any(word.startswith(prefix) for word in words) for prefix in name_prefixes) and \
+                        all(str(patient_id).startswith(prefix) for prefix in id_prefixes):
+                    results.append((patient_id, label))
+                    if len(results) == limit:
+                        break
+            return results
+
+
+patient_typeahead = PatientPrefixIndex(
+    refresh_interval=getattr(settings, 'PATIENT_TYPEAHEAD_REFRESH_INTERVAL', 5),
+    rebuild_interval=getattr(settings, 'PATIENT_TYPEAHEAD_REBUILD_INTERVAL', 600),
+)
@@ -0,0 +1,31 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes the SHA-256 and size of each uploaded file as its chunks arrive,
+    then passes the data on unchanged to the next handler. Results are kept
+    in ``results`` keyed by form field name.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.results = {}
+        self._hasher = None
+        self._size = 0
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self._hasher = hashlib.sha256()
+        self._size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hasher.update(raw_data)
+        self._size += len(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.results[self.field_name] = (self._hasher.hexdigest(), self._size)
+        return None  # Let the next handler build the uploaded file
@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+UNIQUE_CODE_RE = re.compile(r'^CHMC-[0-9A-F]{8}$')
+# How far back each refresh reaches before the previous load, for transactions still committing then
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+
+def normalize_unique_code(code):
+    """Return the code in canonical CHMC-XXXXXXXX form, or None if it is malformed."""
+    code = str(code or '').strip().upper()
+    return code if UNIQUE_CODE_RE.match(code) else None
+
+
+def _code_to_int(code):
+    return int(code[5:], 16)
+
+
+class IssuedCodeFilter:
+    """
+    Sorted array of every issued unique code, held in memory so lookups for
+    codes that were never issued are rejected without touching the database.
+
+    The array is built lazily on first use and updated by signals when this
+    process issues a code. Codes issued by other worker processes, including
+    codes backfill_unique_codes writes onto old rows, are picked up by an
+    incremental refresh of the codes assigned since the last load (at most
+    once per refresh interval, and only on a miss) and by a periodic full
+    rebuild, which also drops codes deleted elsewhere.
+    """
+
+    def __init__(self, refresh_interval=5, rebuild_interval=600):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._codes = array('I')
+        self._loaded_at = None  # When the last build or refresh started
+        self._built_at = None
+        self._refreshed_at = 0
+
+    def _queryset(self):
+        from .models import Examination
+        return Examination.objects.filter(unique_code__isnull=False)
+
+    def rebuild(self):
+        loaded_at = timezone.now()
+        codes = array('I')
+        for code in self._queryset().values_list('unique_code', flat=True).iterator(chunk_size=2000):
+            codes.append(_code_to_int(code))
+        codes = array('I', sorted(codes))
+        with self._lock:
+            self._codes = codes
+            self._loaded_at = loaded_at
+            self._built_at = self._refreshed_at = time.monotonic()
+
+    def _refresh(self):
+        """Add codes assigned since the last build or refresh, through the index on the assignment time."""
+        loaded_at = timezone.now()
+        # The overlap catches codes whose transaction committed after the last load had started
+        new_codes = list(self._queryset().filter(
+            unique_code_assigned_at__gte=self._loaded_at - REFRESH_OVERLAP,
+        ).values_list('unique_code', flat=True))
+        with self._lock:
+            for code in new_codes:
+                self._insert(_code_to_int(code))
+            self._loaded_at = loaded_at
+            self._refreshed_at = time.monotonic()
+
+    def _insert(self, value):
+        index = bisect_left(self._codes, value)
+        if index == len(self._codes) or self._codes[index] != value:
+            self._codes.insert(index, value)
+
+    def _contains(self, value):
+        index = bisect_left(self._codes, value)
+        return index < len(self._codes) and self._codes[index] == value
+
+    def add(self, code):
+        if self._built_at is None:
+            return  # Picked up by the first build
+        with self._lock:
+            self._insert(_code_to_int(code))
+
+    def discard(self, code):
+        value = _code_to_int(code)
+        with self._lock:
+            index = bisect_left(self._codes, value)
+            if index < len(self._codes) and self._codes[index] == value:
+                del self._codes[index]
+
+    def might_contain(self, code):
+        """Return False only when the normalized code has certainly not been issued."""
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at > self.rebuild_interval:
+            self.rebuild()
+        value = _code_to_int(code)
+        if self._contains(value):
+            return True
+        if now - self._refreshed_at > self.refresh_interval:
+            self._refresh()
+            return self._contains(value)
+        return False
+
+
+class LRUCache:
+    """Small thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+issued_codes = IssuedCodeFilter(
+    refresh_interval=getattr(settings, 'VERIFICATION_FILTER_REFRESH_INTERVAL', 5),
+    rebuild_interval=getattr(settings, 'VERIFICATION_FILTER_REBUILD_INTERVAL', 600),
+)
+
+# Maps a unique code to (path of its edited document or '', the document's SHA-256 when its integrity checked out)
+verified_documents = LRUCache(
+    maxsize=getattr(settings, 'VERIFICATION_HIT_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'VERIFICATION_HIT_CACHE_TTL', 60),
+)
@@ -1,9 +1,7 @@
 import base64, re
 import os
 import hashlib
-import pythoncom
 import json
-from win32com.client import Dispatch
 from io import BytesIO
 from PIL import Image
 from django.core.files.base import ContentFile
@@ -14,19 +12,31 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib.sessions.backends.db import SessionStore
-from django.db.models import Sum, Count, Q, Prefetch
-from webapp.models import Appointment, Payment, CustomUser, ServiceType, Patient, Examination
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+from webapp.models import Appointment, Payment, CustomUser, ServiceType, Patient, Examination, BackgroundJob
 from django.utils import timezone
 from django.utils.crypto import get_random_string
-from django.http import HttpResponseRedirect, JsonResponse, FileResponse, HttpResponse
+from django.http import HttpResponseRedirect, JsonResponse, FileResponse, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 from datetime import datetime
-from .forms import UserCreationForm, EditAccountForm, EditProfileForm, AppointmentForm, ExaminationForm, UploadEditedDocumentForm, UploadResultImageForm, EditExaminationForm
+from .pdf_cache import cached_pdf_etag, get_cached_pdf, get_or_convert_pdf
+from .file_responses import serve_file
+from .upload_handlers import HashingUploadHandler
+from .jobs import enqueue_job
+from .verification import issued_codes, verified_documents, normalize_unique_code
+from .pagination import paginate_keyset
+from .search import search_patients
+from .typeahead import patient_typeahead
+from .duplicates import find_duplicate_patients
+from .rollups import dashboard_totals
+from .exports import EXPORT_FORMATS, export_rows
+from .filters import filter_examinations
+from .forms import UserCreationForm, EditAccountForm, EditProfileForm, AppointmentForm, ExaminationForm, UploadEditedDocumentForm, UploadResultImageForm, EditExaminationForm, ExaminationFilterForm
 from django.views.decorators.csrf import csrf_protect, csrf_exempt
-from docx import Document
-from docx.shared import Inches
 from django.conf import  settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.paginator import Paginator
 
 
 def login_view(request):
@@ -116,40 +126,10 @@ def patients_list_view(request):
 
 @user_passes_test(lambda u: u.is_superuser)
 def admin_dashboard_view(request):
-    # today = timezone.now()
-    # start_of_week = today - timedelta(days=today.weekday())
-
-    # # Total income by payment method
-    # daily_income_cash = Payment.objects.filter(date__date=today.date(), method='cash').aggregate(total=Sum('amount'))['total'] or 0
-    # daily_income_gcash = Payment.objects.filter(date__date=today.date(), method='gcash').aggregate(total=Sum('amount'))['total'] or 0
-    # weekly_income_cash = Payment.objects.filter(date__gte=start_of_week, method='cash').aggregate(total=Sum('amount'))['total'] or 0
-    # weekly_income_gcash = Payment.objects.filter(date__gte=start_of_week, method='gcash').aggregate(total=Sum('amount'))['total'] or 0
-
-    # # Count total patients attended
-    # # Count total patients for today
-    # today_patients = Patient.objects.count
-
-    # # Count total patients for the week
-    # weekly_patients = Patient.objects.count
-
-    # # Get today's appointments
-    # today_appointments = Appointment.objects.filter(date__date=today.date())
-    
-    # # Get all appointments
-    # all_appointments = Appointment.objects.all()
-
-    # context = {
-    #     'daily_income_cash': daily_income_cash,
-    #     'daily_income_gcash': daily_income_gcash,
-    #     'weekly_income_cash': weekly_income_cash,
-    #     'weekly_income_gcash': weekly_income_gcash,
-    #     'today_patients': today_patients,  # Total distinct patients today
-    #     'weekly_patients': weekly_patients,  # Total distinct patients this week
-    #     'today_appointments': today_appointments,  # Today's appointments
-    #     'all_appointments': all_appointments,  # All appointments
-    # }
-
-    return render(request, 'admin/admin_dashboard.html')
+    # Income comes from the daily payment rollups (at most a week of rows), so the dashboard
+    # does not aggregate every payment on each load; patients are one indexed count
+    context = dashboard_totals()
+    return render(request, 'admin/admin_dashboard.html', context)
 
 def admin_logout_view(request):
     logout(request)  # This logs out the user
@@ -270,27 +250,57 @@ def edit_profile_view(request, account_id):
     return render(request, 'employee/edit_profile.html', {'form': form, 'account': account})
 
 
+PATIENTS_PER_PAGE = 30
+
+
 @user_passes_test(lambda u: u.is_employee)
 def employee_patients_list_view(request):
-    # Fetching all patients, or you can filter as needed
-    patients = Patient.objects.all()
-    examinations = (
-        Examination.objects.select_related('patient', 'attending_doctor')
-        .prefetch_related('service_types', Prefetch('payment_set'))
-        .order_by('-date_created')  # Order by latest examination first
-    )
-    service_types = ServiceType.objects.all()
+    # One page of patient cards; each patient's history is loaded when its modal opens
+    paginator = Paginator(Patient.objects.order_by('id'), PATIENTS_PER_PAGE)
+    patients = paginator.get_page(request.GET.get('page'))
 
     account = request.user
     context = {
         'account': account,
         'patients': patients,
-        'service_types' : service_types,
-        'examinations' : examinations
     }
     return render(request, 'employee/patients_list.html', context)
 
 
+@user_passes_test(lambda u: u.is_employee)
+def patient_history(request, pk):
+    """Patient details and examination history shown in the patients list modal."""
+    patient = get_object_or_404(Patient, pk=pk)
+    examinations = (
+        patient.examinations.prefetch_related('service_types', Examination.prefetch_payments())
+        .order_by('-date_created')
+    )
+
+    history = []
+    for exam in examinations:
+        payment = exam.primary_payment
+        history.append({
+            'service_types': ', '.join(service.name for service in exam.service_types.all()),
+            'date_created': timezone.localtime(exam.date_created).strftime('%B %d, %Y, %I:%M %p'),
+            'payment_method': payment.get_method_display() if payment else None,
+            'payment_amount': str(payment.amount) if payment else None,
+            'payment_status': payment.status if payment else None,
+        })
+
+    return JsonResponse({
+        'patient': {
+            'full_name': patient.get_full_name_with_middle_initial(),
+            'formatted_id': patient.get_formatted_id(),
+            'age': patient.age,
+            'sex': patient.sex,
+            'address': patient.address,
+            'contact_number': patient.contact_number,
+            'image_url': patient.image.url if patient.image else None,
+        },
+        'examinations': history,
+    })
+
+
 @user_passes_test(lambda u: u.is_employee)
 def document_results_view(request):
        account = request.user
@@ -335,25 +345,65 @@ def add_appointment(request):
     }
     return render(request, 'employee/add_appointment.html', context)
 
+EXAMINATIONS_PER_PAGE = 25
+
+
 @user_passes_test(lambda u: u.is_employee)
 def employee_examination_view(request):
-    # Fetch examinations along with related patient and payment details
+    # Fetch one page of examinations along with related patient and payment details
     account = request.user
-    examinations = (
+    filter_form = ExaminationFilterForm(request.GET or None)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    examinations = filter_examinations(
         Examination.objects.select_related('patient', 'attending_doctor')
-        .prefetch_related('service_types', Prefetch('payment_set'))
-        .order_by('-date_created')  # Order by latest examination first
+        .prefetch_related('service_types', Examination.prefetch_payments()),
+        filters,
+    )
+    # Latest examination first, continuing from the cursor in the query string
+    page = paginate_keyset(
+        examinations, ('date_created', 'id'),
+        after=request.GET.get('after'), before=request.GET.get('before'),
+        page_size=EXAMINATIONS_PER_PAGE,
     )
     service_types = ServiceType.objects.all()
 
+    # Page links keep the current filters
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+
     context = {
         'account' : account,
-        'examinations': examinations,
+        'examinations': page,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': query.urlencode(),
         'service_types': service_types
     }
     return render(request, 'employee/examination.html', context)
 
 
+@user_passes_test(lambda u: u.is_employee)
+def export_examinations(request):
+    """Stream the filtered examination list, one row per payment, as CSV or XLSX."""
+    # Always bound, so an export without any filters validates and exports everything
+    filter_form = ExaminationFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({"error": filter_form.errors}, status=400)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"Unsupported format {export_format!r}."}, status=400)
+
+    stream, content_type, extension = EXPORT_FORMATS[export_format]
+    rows = export_rows(filter_examinations(Examination.objects.all(), filter_form.cleaned_data))
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    filters = filter_form.cleaned_data
+    period = '_'.join(str(day) for day in (filters.get('date_from'), filters.get('date_to')) if day) or 'all'
+    response['Content-Disposition'] = f'attachment; filename="examinations_{period}.{extension}"'
+    return response
+
+
 def add_examination(request):
     account = request.user
 
@@ -361,91 +411,83 @@ def add_examination(request):
         # Handle patient search (AJAX request)
         if 'search_patient' in request.POST:
             search_query = request.POST.get('search_patient', '').strip()
-            # Filter patients by name or ID
-            patients = Patient.objects.filter(
-                Q(first_name__istartswith=search_query) |
-                Q(last_name__istartswith=search_query) |
-                Q(middle_name__istartswith=search_query) |
-                Q(id__icontains=search_query)
-            )
-            # Prepare patient data for JSON response
-            patient_list = [
-                {
-                    'id': patient.id,
-                    'first_name': patient.first_name,
-                    'last_name': patient.last_name,
-                    'middle_name': patient.middle_name or '',
-                    'age': patient.age,
-                    'sex': patient.sex,
-                    'address': patient.address,
-                    'contact_number': patient.contact_number,
-                    'image_url': patient.image.url if patient.image else None,
-                }
-                for patient in patients
-            ]
-            return JsonResponse({'patients': patient_list})
+            patients = search_patients(search_query, limit=PATIENT_SEARCH_LIMIT)
+            return JsonResponse({'patients': [patient_search_result(patient) for patient in patients]})
 
         # Handle form submission for adding an examination
         form = ExaminationForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                # Check if a patient is selected from the search results
-                patient_id = request.POST.get('patient_id')
-                if patient_id:
-                    patient = get_object_or_404(Patient, id=patient_id)
+                # Create the patient, examination (with its file number) and payment together
+                with transaction.atomic():
+                    # Check if a patient is selected from the search results or the duplicate warning
+                    patient_id = request.POST.get('patient_id') or request.POST.get('existing_patient_id')
+                    if patient_id:
+                        patient = get_object_or_404(Patient, id=patient_id)
                     
-                    # If the patient has an existing image, remove it before adding a new one
-                    if patient.image:
-                        patient.image.delete()
+                        # If the patient has an existing image, remove it before adding a new one
+                        if patient.image:
+                            patient.image.delete()
                     
-                    # Handle the new image from the webcam
-                    image_data = request.POST.get('image')  # Captured image data from the form
-                    if image_data:
-                        # Convert base64 image data to a Django ImageFile
-                        format, imgstr = image_data.split(';base64,')  # Get base64 string
-                        ext = format.split('/')[1]  # Extract file extension (png, jpeg, etc.)
-                        image_data = ContentFile(base64.b64decode(imgstr), name=f"patient_{patient.id}_image.{ext}")
+                        # Handle the new image from the webcam
+                        image_data = request.POST.get('image')  # Captured image data from the form
+                        if image_data:
+                            # Convert base64 image data to a Django ImageFile
+                            format, imgstr = image_data.split(';base64,')  # Get base64 string
+                            ext = format.split('/')[1]  # Extract file extension (png, jpeg, etc.)
+                            image_data = ContentFile(base64.b64decode(imgstr), name=f"patient_{patient.id}_image.{ext}")
                         
-                        # Save the new image to the patient instance
-                        patient.image = image_data
+                            # Save the new image to the patient instance
+                            patient.image = image_data
+                            patient.save()
+                    else:
+                        # Create a new patient if not selected
+                        first_name = form.cleaned_data['first_name']
+                        last_name = form.cleaned_data['last_name']
+                        middle_name = form.cleaned_data['middle_name']
+                        age = form.cleaned_data['age']
+                        sex = form.cleaned_data['sex']
+                        address = form.cleaned_data['address']
+                        contact_number = form.cleaned_data['contact_number']
+
+                        patient = Patient(
+                            first_name=first_name,
+                            last_name=last_name,
+                            middle_name=middle_name,
+                            age=age,
+                            sex=sex,
+                            address=address,
+                            contact_number=contact_number,
+                        )
+                        # Ask before registering someone who looks like an existing patient
+                        if not request.POST.get('confirm_new_patient'):
+                            duplicates = find_duplicate_patients(patient)
+                            if duplicates:
+                                return render(request, 'employee/add_examination.html', {
+                                    'form': form,
+                                    'account': account,
+                                    'duplicates': duplicates,
+                                })
                         patient.save()
-                else:
-                    # Create a new patient if not selected
-                    first_name = form.cleaned_data['first_name']
-                    last_name = form.cleaned_data['last_name']
-                    middle_name = form.cleaned_data['middle_name']
-                    age = form.cleaned_data['age']
-                    sex = form.cleaned_data['sex']
-                    address = form.cleaned_data['address']
-                    contact_number = form.cleaned_data['contact_number']
-
-                    patient = Patient.objects.create(
-                        first_name=first_name,
-                        last_name=last_name,
-                        middle_name=middle_name,
-                        age=age,
-                        sex=sex,
-                        address=address,
-                        contact_number=contact_number,
-                    )
-
-                # Create the examination
-                examination = Examination.objects.create(
-                    patient=patient,
-                    attending_doctor=form.cleaned_data['attending_doctor']
-                )
-                examination.service_types.set(form.cleaned_data['service_types'])
 
-                # Create payment record
-                Payment.objects.create(
-                    examination=examination,
-                    method=form.cleaned_data['method'],
-                    amount=form.cleaned_data['amount'],
-                    status=form.cleaned_data['status']
-                )
+                    # Create the examination
+                    examination = Examination.objects.create(
+                        patient=patient,
+                        attending_doctor=form.cleaned_data['attending_doctor']
+                    )
+                    examination.service_types.set(form.cleaned_data['service_types'])
+                    examination.assign_unique_codes()
+
+                    # Create payment record
+                    Payment.objects.create(
+                        examination=examination,
+                        method=form.cleaned_data['method'],
+                        amount=form.cleaned_data['amount'],
+                        status=form.cleaned_data['status']
+                    )
 
-                # Generate the document
-                generate_examination_document(examination)
+                    # Generate the document in the background once the examination is committed
+                    enqueue_job('generate_document', examination)
 
                 return redirect('employee_examination')  # Redirect to success page
             except Exception as e:
@@ -462,81 +504,6 @@ def add_examination(request):
         'account': account,
     })
 
-def generate_examination_document(examination):
-    template_path = 'templates/examination_template.docx'
-    output_path = os.path.join(settings.MEDIA_ROOT, 'examination_documents')  # Store the relative path
-
-    if not os.path.exists(output_path):
-        os.makedirs(output_path)
-
-    # Load the document template
-    doc = Document(template_path)
-
-    # Populate the template with examination details
-    patient = examination.patient
-    doctor = examination.attending_doctor
-    patient_full_name = patient.get_full_name_with_middle_initial()
-    doctor_full_name = doctor.get_full_name_with_middle_initial()
-    file_number = examination.get_file_number()
-    patient_full_name_lastname_starting = patient.patient_full_name_last_name_start()
-
-    # Generate the unique code
-    salt = "CHMC2024"
-    pepper = "WBMS2025"
-    raw_code = f"{file_number}-{patient_full_name}-{doctor_full_name}"
-    sha_input = f"{salt}{raw_code}{pepper}".encode('utf-8')
-    unique_code = hashlib.sha256(sha_input).hexdigest()[:8].upper()
-    unique_code = f"CHMC-{unique_code}"
-
-    # Fill the template with text
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                cell.text = cell.text.replace('{PATIENT_NAME}', patient_full_name)
-                cell.text = cell.text.replace('{AGE}', str(patient.age))
-                cell.text = cell.text.replace('{SEX}', patient.sex)
-                cell.text = cell.text.replace('{SERVICE_TYPE}', ', '.join([str(s) for s in examination.service_types.all()]))
-                cell.text = cell.text.replace('{DATE}', examination.date_created.strftime('%B %d, %Y'))
-                cell.text = cell.text.replace('{FILE_NO}', file_number)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                # Add patient image if placeholder is found
-                    if '{PATIENT_IMAGE}' in cell.text:
-                        cell.text = cell.text.replace('{PATIENT_IMAGE}', '')  # Clear the placeholder text
-                        if patient.image:
-                            run = cell.paragraphs[0].add_run()
-                            run.add_picture(patient.image.path, width=Inches(1), height=Inches(1))
-
-    footer = doc.sections[0].footer  # Get the footer from the first section
-
-    # Iterate over paragraphs in the footer
-    for paragraph in footer.paragraphs:
-        # Replace placeholders in the footer
-        if '{DOCTOR_NAME}' in paragraph.text:
-            paragraph.text = paragraph.text.replace('{DOCTOR_NAME}', doctor_full_name)
-
-        if '{SIGNATURE}' in paragraph.text:
-            paragraph.text = paragraph.text.replace('{SIGNATURE}', '')  # Clear the placeholder
-            if doctor.signature_image:
-                run = paragraph.add_run()
-                run.add_picture(doctor.signature_image.path, width=Inches(1), height=Inches(1))  # Add signature image
-
-        if '{UNIQUE_CODE}' in paragraph.text:
-            paragraph.text = paragraph.text.replace('{UNIQUE_CODE}', unique_code)
-
-    # Save the document
-    output_filename = f"{patient_full_name_lastname_starting}.docx"
-    output_full_path = os.path.join(output_path, output_filename)
-    doc.save(output_full_path)
-
-    # Attach the document to the Examination instance with the relative path
-    examination.document.name = os.path.relpath(output_full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
-    examination.save()
-
-
 @user_passes_test(lambda u: u.is_employee)
 def edit_document(request, examination_id):
     account = request.user
@@ -557,46 +524,45 @@ def edit_document(request, examination_id):
 def download_document(request, pk):
     examination = get_object_or_404(Examination, pk=pk)
     if examination.document:
-        return FileResponse(examination.document.open(), as_attachment=True, filename=examination.document.name)
+        if not examination.document_hash:
+            # Documents generated before hashes were stored
+            examination.document_hash = examination.calculate_document_hash(examination.document.path)
+            examination.save(update_fields=['document_hash'])
+        return serve_file(
+            request, examination.document.path,
+            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+            etag=examination.document_hash, as_attachment=True, filename=examination.document.name,
+        )
     return redirect('employee_examination')  # Redirect to the examination list if no document.
 
+@csrf_exempt
 def upload_edited_document(request, pk):
+    # The hashing handler must be installed before CSRF checking reads the request body
+    hashing_handler = HashingUploadHandler(request)
+    request.upload_handlers.insert(0, hashing_handler)
+    return _upload_edited_document(request, pk, hashing_handler)
+
+@csrf_protect
+def _upload_edited_document(request, pk, hashing_handler):
     examination = get_object_or_404(Examination, pk=pk)
 
     if request.method == 'POST':
         form = UploadEditedDocumentForm(request.POST, request.FILES, instance=examination)
         if form.is_valid():
             form.save()
+            # The hash and size were computed while the upload streamed in
+            if 'edited_document' in hashing_handler.results:
+                examination.record_document_hash(*hashing_handler.results['edited_document'])
+            else:
+                examination.save_original_document_hash()
+            # Convert to PDF ahead of the first view
+            enqueue_job('convert_pdf', examination)
             return redirect('employee_examination')
         else:
             return JsonResponse({'message': 'Failed to upload document.'}, status=400)
 
     return JsonResponse({'message': 'Invalid request method.'}, status=400)
 
-def docx_to_pdf_exact(docx_path):
-
-    try:
-        # Initialize COM library
-        pythoncom.CoInitialize()
-
-        # Start MS Word
-        word = Dispatch('Word.Application')
-        word.Visible = False
-
-        doc = word.Documents.Open(docx_path)
-        pdf_path = docx_path.replace('.docx', '.pdf')
-        doc.SaveAs(pdf_path, FileFormat=17)  # 17 corresponds to the PDF format
-        doc.Close()
-        word.Quit()
-
-        # Return the path to the PDF
-        return pdf_path
-    except Exception as e:
-        raise RuntimeError(f"Error during conversion: {e}")
-    finally:
-        # Ensure COM library is uninitialized
-        pythoncom.CoUninitialize()
-
 def view_document(request, pk):
 
     examination = get_object_or_404(Examination, pk=pk)
@@ -607,39 +573,25 @@ def view_document(request, pk):
 
     # Convert .docx to PDF
     try:
-        pdf_path = docx_to_pdf_exact(examination.edited_document.path)
+        # The stored hash can be trusted while the file is unchanged since upload
+        if examination.verify_document_integrity():
+            document_hash = examination.original_document_hash
+        else:
+            document_hash = examination.calculate_document_hash(examination.edited_document.path)
+        pdf_path = get_or_convert_pdf(examination.edited_document.path, document_hash)
 
-        # Return the PDF file
-        return FileResponse(open(pdf_path, 'rb'), content_type='application/pdf')
+        # Return the PDF file, validated by the conversion it came from (a re-conversion differs byte for byte)
+        return serve_file(request, pdf_path, content_type='application/pdf', etag=cached_pdf_etag(document_hash, pdf_path))
     except Exception as e:
         # Handle errors gracefully
         return HttpResponse(f"Error during document view: {e}", status=500)
     
-def docx_to_pdf_auth_checker(docx_path):
-    """
-    Converts a .docx file to PDF using MS Word (COM automation).
-    """
-    try:
-        pythoncom.CoInitialize()  # Initialize COM library
-        word = Dispatch('Word.Application')
-        word.Visible = False  # Keep Word invisible
-        doc = word.Documents.Open(docx_path)
-        pdf_path = docx_path.replace('.docx', '.pdf')
-        doc.SaveAs(pdf_path, FileFormat=17)  # 17 corresponds to PDF format
-        doc.Close()
-        word.Quit()
-        return pdf_path
-    except Exception as e:
-        raise RuntimeError(f"Error during conversion: {e}")
-    finally:
-        pythoncom.CoUninitialize()  # Cleanup COM library
-
 def verify_document(request):
     """
     Verify a document by checking the unique code and displaying the PDF if valid.
     """
     if request.method == 'POST':
-        unique_code = request.POST.get('unique_code')
+        unique_code = request.POST.get('unique_code', '').strip().upper()
 
         try:
             # Split the code to get necessary parts
@@ -651,23 +603,38 @@ def verify_document(request):
             if code_prefix != "CHMC":
                 return HttpResponse("Invalid prefix in the code.")
 
-            # Iterate through all examinations to find the one that matches the unique code
-            examination = None
-            for ex in Examination.objects.all():
-                if ex.get_unique_code() == unique_code:
-                    examination = ex
-                    break
+            unique_code = normalize_unique_code(unique_code)
+            if unique_code is None:
+                return HttpResponse("Invalid code format.")
 
-            if not examination:
+            # Reject codes that were never issued without touching the database
+            if not issued_codes.might_contain(unique_code):
                 return HttpResponse("Document not found for the provided code.")
 
+            # Recently verified codes skip the indexed lookup entirely
+            verified = verified_documents.get(unique_code)
+            if verified is None:
+                examination = Examination.objects.filter(unique_code=unique_code).only(
+                    'id', 'edited_document', 'original_document_hash', 'edited_document_size', 'edited_document_hashed_at',
+                ).first()
+                if not examination:
+                    return HttpResponse("Document not found for the provided code.")
+                if examination.has_edited_document():
+                    # The stored hash can be trusted while the file is unchanged since upload
+                    document_hash = examination.original_document_hash if examination.verify_document_integrity() else None
+                    verified = (examination.edited_document.path, document_hash)
+                else:
+                    verified = ('', None)
+                verified_documents.set(unique_code, verified)
+            document_path, document_hash = verified
+
             # Check if an edited document exists
-            if not examination.has_edited_document():
+            if not document_path:
                 return HttpResponse("This document does not have an edited version.")
 
             # Convert the .docx document to PDF if not already converted
             try:
-                pdf_path = docx_to_pdf_auth_checker(examination.edited_document.path)
+                pdf_path = get_or_convert_pdf(document_path, document_hash)
 
                 # Serve the PDF file for the user to view
                 return FileResponse(open(pdf_path, 'rb'), content_type='application/pdf')
@@ -679,6 +646,100 @@ def verify_document(request):
     else:
         return render(request, 'authenticity_checker.html')
     
+MAX_BATCH_VERIFY_CODES = 500
+
+
+@csrf_exempt
+def verify_documents_batch(request):
+    """
+    Verify many unique codes at once. Expects a JSON body such as
+    {"codes": ["CHMC-1A2B3C4D", ...], "render": false} and resolves all codes
+    with a single query, answering one result per code in the order given.
+    With "render" true, documents whose PDF is not cached yet are queued for
+    conversion by the job worker rather than converted in this (public)
+    request.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method."}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON format"}, status=400)
+
+    codes = data.get("codes") if isinstance(data, dict) else None
+    if not isinstance(codes, list) or not codes:
+        return JsonResponse({"error": "Provide a non-empty list of codes."}, status=400)
+    if len(codes) > MAX_BATCH_VERIFY_CODES:
+        return JsonResponse({"error": f"At most {MAX_BATCH_VERIFY_CODES} codes can be verified at once."}, status=400)
+    render_pdf = bool(data.get("render", False))
+
+    # Pairs rather than a dict, so repeated codes each get their result
+    normalized = [(code, normalize_unique_code(code)) for code in map(str, codes)]
+    candidates = {value for _code, value in normalized if value and issued_codes.might_contain(value)}
+
+    examinations = Examination.objects.filter(
+        unique_code__in=candidates
+    ).only(
+        'id', 'file_number', 'unique_code', 'date_created', 'edited_document',
+        'original_document_hash', 'edited_document_size', 'edited_document_hashed_at',
+    )
+    by_code = {examination.unique_code: examination for examination in examinations} if candidates else {}
+    if render_pdf:
+        # Conversions already waiting for a worker are not queued again
+        queued = set(BackgroundJob.objects.filter(
+            task='convert_pdf', examination__in=by_code.values(),
+            status__in=[BackgroundJob.QUEUED, BackgroundJob.RUNNING],
+        ).values_list('examination_id', flat=True))
+
+    results = []
+    for code, value in normalized:
+        result = {"code": code}
+        examination = by_code.get(value) if value else None
+        if value is None:
+            result["status"] = "invalid"
+        elif examination is None:
+            result["status"] = "not_found"
+        else:
+            result.update({
+                "status": "found",
+                "file_number": examination.file_number,
+                "date_created": examination.date_created.isoformat(),
+                "has_edited_document": examination.has_edited_document(),
+                "integrity_ok": examination.verify_document_integrity(),
+            })
+            if render_pdf and examination.has_edited_document():
+                # Warm the PDF cache so fetching the document through verify_document is immediate
+                if result["integrity_ok"] and get_cached_pdf(examination.original_document_hash):
+                    result["pdf_ready"] = True
+                else:
+                    if examination.id not in queued:
+                        enqueue_job('convert_pdf', examination)
+                        queued.add(examination.id)
+                    result["pdf_queued"] = True
+        results.append(result)
+
+    return JsonResponse({"results": results})
+
+
+PATIENT_SEARCH_LIMIT = 10
+
+
+def patient_search_result(patient):
+    """The patient fields the add examination form fills in from a search result."""
+    return {
+        "id": patient.id,
+        "first_name": patient.first_name or "",
+        "middle_name": patient.middle_name or "",
+        "last_name": patient.last_name or "",
+        "age" : patient.age or "",
+        "sex" : patient.sex or "",
+        "contact_number" : patient.contact_number or "",
+        "address" :patient.address or "",
+        "image_url": patient.image.url if patient.image else None,
+    }
+
+
 @csrf_exempt
 def search_patient(request):
     if request.method == "POST":
@@ -686,47 +747,9 @@ def search_patient(request):
             data = json.loads(request.body)
             query = data.get("query", "").strip()
             if query:
-                # Split the query into parts (e.g., "John Doe")
-                name_parts = query.split()
-                filters = Q()
-
-                if len(name_parts) == 1:
-                    # Search for matches in first, middle, or last name
-                    filters |= (
-                        Q(first_name__icontains=name_parts[0]) |
-                        Q(middle_name__icontains=name_parts[0]) |
-                        Q(last_name__icontains=name_parts[0])
-                    )
-                elif len(name_parts) > 1:
-                    # Search for first + last name or other combinations
-                    filters |= (
-                        Q(first_name__icontains=name_parts[0]) & 
-                        Q(last_name__icontains=name_parts[1])
-                    )
-                    # Optionally include middle name if three parts are provided
-                    if len(name_parts) > 2:
-                        filters |= (
-                            Q(first_name__icontains=name_parts[0]) &
-                            Q(middle_name__icontains=name_parts[1]) &
-                            Q(last_name__icontains=name_parts[2])
-                        )
-
-                # Filter patients based on the query
-                patients = Patient.objects.filter(filters)[:10]
-                results = [
-                    {
-                        "id": patient.id,
-                        "first_name": patient.first_name or "",
-                        "middle_name": patient.middle_name or "",
-                        "last_name": patient.last_name or "",
-                        "age" : patient.age or "",
-                        "sex" : patient.sex or "",
-                        "contact_number" : patient.contact_number or "",
-                        "address" :patient.address or ""
-                    }
-                    for patient in patients
-                ]
-                return JsonResponse({"patients": results})
+                # Names match by word prefix in any order ("doe jo"), IDs as "PID-012" or "12"
+                patients = search_patients(query, limit=PATIENT_SEARCH_LIMIT)
+                return JsonResponse({"patients": [patient_search_result(patient) for patient in patients]})
 
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON format"}, status=400)
@@ -735,6 +758,17 @@ def search_patient(request):
 
     return JsonResponse({"patients": []})
 
+@user_passes_test(lambda u: u.is_employee)
+def patient_typeahead_view(request):
+    """Suggestions shown while typing; answered from memory, the full record is fetched on pick."""
+    query = request.GET.get("q", "").strip()
+    suggestions = patient_typeahead.suggest(query, limit=PATIENT_SEARCH_LIMIT) if query else []
+    width = Patient.get_id_width()
+    return JsonResponse({"patients": [
+        {"id": patient_id, "name": name, "pid": f"PID-{patient_id:0{width}d}"}
+        for patient_id, name in suggestions
+    ]})
+
 def upload_examination_result_image(request, pk):
     if request.method == "POST":
         exam = get_object_or_404(Examination, pk=pk)
@@ -757,7 +791,7 @@ def upload_examination_result_image(request, pk):
 
 def edit_examination(request, pk):
     exam = get_object_or_404(Examination, pk=pk)
-    payment = exam.payment_set.first()  # Assuming one payment per exam
+    payment = exam.primary_payment  # Assuming one payment per exam
 
     PAYMENT_METHODS = Payment.PAYMENT_METHODS
     if request.method == 'POST':